@@ -0,0 +1,76 @@
+import argparse
+import time
+from itertools import combinations
+
+import numpy as np
+from scipy.optimize import minimize
+
+from estimator import estimate_pairwise, estimate_amplitude
+from grid_solver import grid_solve
+from settings import WIDTH, HEIGHT, EPS
+
+
+# the original per-pair python objective from display.estimate_source, kept as the reference
+def legacy_estimate(positions, readings):
+    logs = np.log(np.asarray(readings, dtype=float) + EPS)
+    x0, y0 = np.mean([p[0] for p in positions]), np.mean([p[1] for p in positions])
+    pairs = list(combinations(range(len(positions)), 2))
+
+    def error(pt):
+        x, y = pt
+        total = 0.0
+        for i, j in pairs:
+            di = np.hypot(x - positions[i][0], y - positions[i][1]) + EPS
+            dj = np.hypot(x - positions[j][0], y - positions[j][1]) + EPS
+            lhs = logs[i] - logs[j]
+            rhs = 2.0 * (np.log(dj) - np.log(di))
+            total += (lhs - rhs) ** 2
+        return total
+
+    return minimize(error, (x0, y0)).x
+
+
+def make_case(rng, n, noise):
+    positions = rng.uniform((0, 0), (WIDTH, HEIGHT), size=(n, 2))
+    source = rng.uniform((0, 0), (WIDTH, HEIGHT))
+    d2 = np.sum((positions - source) ** 2, axis=1) + 1.0
+    readings = 1e6 / d2 * np.exp(rng.normal(0.0, noise, n))
+    return [tuple(p) for p in positions], readings
+
+
+def timed(fn, cases):
+    out = []
+    start = time.perf_counter()
+    for positions, readings in cases:
+        out.append(np.asarray(fn(positions, readings), dtype=float))
+    return (time.perf_counter() - start) / len(cases), np.array(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="compare the legacy and vectorized estimators")
+    parser.add_argument("--sensors", type=int, nargs="+", default=[3, 5, 8, 12, 32])
+    parser.add_argument("--cases", type=int, default=50)
+    parser.add_argument("--noise", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'sensors':>7} {'legacy ms':>10} {'new ms':>8} {'speedup':>8} {'median err px':>14} {'same int px':>12}"
+          f" {'amplitude ms':>13} {'amp err px':>11} {'grid ms':>8} {'grid err px':>12}")
+    for n in args.sensors:
+        cases = [make_case(rng, n, args.noise) for _ in range(args.cases)]
+        t_old, est_old = timed(legacy_estimate, cases)
+        t_new, est_new = timed(lambda p, r: estimate_pairwise(p, r).x, cases)
+        t_amp, est_amp = timed(lambda p, r: estimate_amplitude(p, r).x[:2], cases)
+        t_grid, est_grid = timed(lambda p, r: grid_solve(p, r).x, cases)
+        # both solvers are local, so a few cases may settle in different minima
+        dist = np.hypot(*(est_old - est_new).T)
+        same = np.mean(np.all(est_old.astype(int) == est_new.astype(int), axis=1))
+        print(f"{n:>7} {t_old * 1e3:>10.2f} {t_new * 1e3:>8.2f} {t_old / t_new:>7.1f}x "
+              f"{np.median(dist):>14.3f} {same:>11.0%} "
+              f"{t_amp * 1e3:>13.2f} {np.median(np.hypot(*(est_old - est_amp).T)):>11.3f} "
+              f"{t_grid * 1e3:>8.2f} {np.median(np.hypot(*(est_old - est_grid).T)):>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
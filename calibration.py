@@ -0,0 +1,90 @@
+import numpy as np
+
+from settings import (EPS, SENSOR_SIZE, PATH_LOSS_EXPONENT, CALIBRATION_PRIOR, CALIBRATION_FORGETTING,
+                      CALIBRATION_EXPONENT_RANGE)
+
+# online calibration of the light model  log R_i = log A + g_i - n * log d_i : the path-loss
+# exponent n (2 for a bare inverse-square law) and a gain offset g_i per mote, both by
+# recursive least squares with exponential forgetting. every update takes one snapshot of
+# readings and the source position that goes with it (the latest estimate, or a known spot)
+# and costs O(1) per reading, history is never refitted.
+#
+# the estimators keep their n = 2 model, they get corrected readings instead:
+# exp((log R_i - g_i) * 2 / n) obeys the inverse-square law exactly when the readings obey
+# the calibrated one, and since log A is a free unknown the scale does not matter
+#
+# gains are kept per registry slot; the source amplitude absorbs any offset common to all motes
+
+
+class PathLossCalibrator:
+    def __init__(self, capacity=16, exponent=PATH_LOSS_EXPONENT, prior=CALIBRATION_PRIOR,
+                 forgetting=CALIBRATION_FORGETTING, exponent_range=CALIBRATION_EXPONENT_RANGE):
+        self.exponent = exponent
+        self.prior = prior
+        self.forgetting = forgetting
+        self.exponent_range = exponent_range
+        # rls information (inverse variance) of the exponent and of every gain
+        self.exponent_weight = prior
+        self.gain = np.zeros(capacity)
+        self.gain_weight = np.full(capacity, prior)
+        self.updates = 0
+
+    def _reserve(self, slots):
+        size = int(np.max(slots)) + 1 if len(slots) else 0
+        if size > len(self.gain):
+            capacity = max(size, 2 * len(self.gain))
+            self.gain = np.r_[self.gain, np.zeros(capacity - len(self.gain))]
+            self.gain_weight = np.r_[self.gain_weight, np.full(capacity - len(self.gain_weight), self.prior)]
+
+    def correct(self, slots, readings):
+        # readings of these slots as the inverse-square model expects them
+        slots = np.asarray(slots, dtype=int)
+        self._reserve(slots)
+        logs = np.log(np.asarray(readings, dtype=float) + EPS) - self.gain[slots]
+        return np.exp(logs * (2.0 / self.exponent))
+
+    def update(self, slots, positions, readings, source):
+        # raw (uncorrected) readings of the slots at positions, lit from source
+        slots = np.asarray(slots, dtype=int)
+        if len(slots) < 3:
+            return
+        self._reserve(slots)
+        logs = np.log(np.asarray(readings, dtype=float) + EPS)
+        dist = np.hypot(*(np.asarray(positions, dtype=float) - source).T)
+        # a mote under the lamp sees its size, not a point
+        log_d = np.log(np.maximum(dist, SENSOR_SIZE))
+        gain = self.gain[slots]
+
+        # exponent: log A drops out across motes,  y_i - mean y = -n (log d_i - mean log d)
+        y = logs - gain
+        x = -(log_d - log_d.mean())
+        y = y - y.mean()
+        self.exponent_weight = self.forgetting * self.exponent_weight + x @ x
+        self.exponent += x @ (y - self.exponent * x) / self.exponent_weight
+        self.exponent = float(np.clip(self.exponent, *self.exponent_range))
+
+        # gains: what every mote reads above the model with this frame's best log A
+        model = -self.exponent * log_d
+        log_a = np.mean(logs - gain - model)
+        weight = self.forgetting * self.gain_weight[slots] + 1.0
+        self.gain[slots] = gain + (logs - model - log_a - gain) / weight
+        self.gain_weight[slots] = weight
+        self.updates += 1
+
+    def state(self, ids):
+        # json for state.json, gains by mote id (motes without one cannot be matched later)
+        gains = {str(sensor_id): [float(self.gain[slot]), float(self.gain_weight[slot])]
+                 for slot, sensor_id in enumerate(ids) if sensor_id is not None and slot < len(self.gain)}
+        return {"exponent": self.exponent, "exponent_weight": self.exponent_weight, "gains": gains}
+
+    def load(self, state, slot_of):
+        # slot_of maps a mote id to its registry slot (None if the mote is not there)
+        if not state:
+            return
+        self.exponent = state.get("exponent", self.exponent)
+        self.exponent_weight = state.get("exponent_weight", self.exponent_weight)
+        for sensor_id, (gain, weight) in state.get("gains", {}).items():
+            slot = slot_of(int(sensor_id))
+            if slot is not None:
+                self._reserve([slot])
+                self.gain[slot], self.gain_weight[slot] = gain, weight
@@ -0,0 +1,253 @@
+import os
+import struct
+
+import numpy as np
+
+from serial_reader import RECORD_NO_SEQ
+from settings import CAPTURE_INDEX_EVERY, CAPTURE_REPLAY_SPEED
+
+# append-only capture of live mote traffic
+#   file  = MAGIC, then blocks
+#   block = HEADER (kind, payload size, host time.time()) + payload
+# READINGS blocks hold one SerialReader.drain() batch, LAYOUT blocks a full snapshot of the
+# sensor layout whenever it changes. every CAPTURE_INDEX_EVERY blocks an INDEX block lists
+# (time, offset, kind) of the blocks since the previous index and links back to it, and
+# close() ends the file with a FOOTER pointing at the last index. a log that was cut short
+# (crash, pulled cable) has no footer and is scanned block by block instead
+
+MAGIC = b'LSCAP01\n'
+HEADER = struct.Struct('<BId')
+KIND_READINGS, KIND_LAYOUT, KIND_INDEX, KIND_FOOTER = 1, 2, 3, 4
+KINDS = (KIND_READINGS, KIND_LAYOUT, KIND_INDEX, KIND_FOOTER)
+
+READING_DTYPE = np.dtype([('t', '<f8'), ('id', '<u2'), ('light', '<u2'), ('seq', 'u1'), ('flags', 'u1')])
+LAYOUT_DTYPE = np.dtype([('id', '<i4'), ('x', '<f4'), ('y', '<f4'), ('active', 'u1')])
+INDEX_DTYPE = np.dtype([('t', '<f8'), ('offset', '<u8'), ('kind', 'u1')])
+
+# offset of the previous index (or the last one, in the footer)
+INDEX_LINK = struct.Struct('<q')
+NO_INDEX = -1
+FOOTER_SIZE = HEADER.size + INDEX_LINK.size
+
+
+class CaptureLog:
+    # read side of a capture; the whole file is loaded, captures are ~14 bytes per reading
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.buf = f.read()
+        if self.buf[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a capture log")
+        self.end = len(self.buf)
+        self.last_index = NO_INDEX
+        self.index = self._read_index()
+        if self.index is None:
+            self.index = self._scan()
+
+    @property
+    def start_time(self):
+        return float(self.index['t'][0]) if len(self.index) else 0.0
+
+    def _block(self, offset):
+        # (kind, t, end of block), None past the end or at a torn block
+        if offset + HEADER.size > len(self.buf):
+            return None
+        kind, size, t = HEADER.unpack_from(self.buf, offset)
+        end = offset + HEADER.size + size
+        if kind not in KINDS or end > len(self.buf):
+            return None
+        return kind, t, end
+
+    def _scan(self):
+        entries, offset = [], len(MAGIC)
+        while (block := self._block(offset)) is not None:
+            kind, t, end = block
+            if kind in (KIND_READINGS, KIND_LAYOUT):
+                entries.append((t, offset, kind))
+            elif kind == KIND_INDEX:
+                self.last_index = offset
+            offset = end
+        self.end = offset
+        return np.array(entries, dtype=INDEX_DTYPE)
+
+    def _read_index(self):
+        # walk the index chain back from the footer, None if the log was not closed cleanly
+        footer = len(self.buf) - FOOTER_SIZE
+        block = self._block(footer) if footer >= len(MAGIC) else None
+        if block is None or block[0] != KIND_FOOTER or block[2] != len(self.buf):
+            return None
+        (offset,) = INDEX_LINK.unpack_from(self.buf, footer + HEADER.size)
+        last_index, parts = offset, []
+        while offset != NO_INDEX:
+            block = self._block(offset) if offset >= len(MAGIC) else None
+            if block is None or block[0] != KIND_INDEX:
+                return None
+            (prev,) = INDEX_LINK.unpack_from(self.buf, offset + HEADER.size)
+            start = offset + HEADER.size + INDEX_LINK.size
+            parts.append(np.frombuffer(self.buf, INDEX_DTYPE, (block[2] - start) // INDEX_DTYPE.itemsize, start))
+            offset = prev
+        index = np.concatenate(parts[::-1]) if parts else np.zeros(0, dtype=INDEX_DTYPE)
+        # a chain that does not reach the first block was appended after a torn session
+        if not len(index) or index['offset'][0] != len(MAGIC):
+            return None
+        self.last_index = last_index
+        # a writer appending to this log writes over the footer
+        self.end = footer
+        return index
+
+    def _payload(self, offset, dtype):
+        _, size, _ = HEADER.unpack_from(self.buf, offset)
+        return np.frombuffer(self.buf, dtype, size // dtype.itemsize, offset + HEADER.size)
+
+    def readings(self, start=0.0):
+        # every reading at or after host time start, as one READING_DTYPE array
+        blocks = self.index[self.index['kind'] == KIND_READINGS]
+        # the block before start may still hold readings past it
+        first = max(np.searchsorted(blocks['t'], start, side='right') - 1, 0)
+        parts = [self._payload(offset, READING_DTYPE) for offset in blocks['offset'][first:].tolist()]
+        if not parts:
+            return np.zeros(0, dtype=READING_DTYPE)
+        readings = np.concatenate(parts)
+        return readings[readings['t'] >= start]
+
+    def layouts(self, start=0.0):
+        # (t, LAYOUT_DTYPE array) for the layout in force at start and every change after it
+        blocks = self.index[self.index['kind'] == KIND_LAYOUT]
+        first = max(np.searchsorted(blocks['t'], start, side='right') - 1, 0)
+        return [(t, self._payload(offset, LAYOUT_DTYPE))
+                for t, offset in zip(blocks['t'][first:].tolist(), blocks['offset'][first:].tolist())]
+
+
+class CaptureWriter:
+    def __init__(self, path, index_every=CAPTURE_INDEX_EVERY):
+        self.path = path
+        self.index_every = index_every
+        self.pending = []
+        self.last_index = NO_INDEX
+        self.blocks = 0
+        self._layout = None
+
+        if os.path.exists(path) and os.path.getsize(path):
+            # continue an earlier capture: keep the index chain, drop a torn last block
+            log = CaptureLog(path)
+            self.last_index = log.last_index
+            # blocks written after the last index of a torn log go into the next one
+            self.pending = [tuple(entry) for entry in log.index[log.index['offset'] > log.last_index].tolist()]
+            with open(path, 'r+b') as f:
+                f.truncate(log.end)
+            self.file = open(path, 'ab')
+        else:
+            self.file = open(path, 'wb')
+            self.file.write(MAGIC)
+
+    def _write(self, kind, t, payload):
+        offset = self.file.tell()
+        self.file.write(HEADER.pack(kind, len(payload), t))
+        self.file.write(payload)
+        return offset
+
+    def _append(self, kind, t, payload):
+        self.pending.append((t, self._write(kind, t, payload), kind))
+        self.blocks += 1
+        if len(self.pending) >= self.index_every:
+            self._write_index()
+
+    def _write_index(self):
+        entries = np.array(self.pending, dtype=INDEX_DTYPE)
+        self.last_index = self._write(KIND_INDEX, self.pending[-1][0],
+                                      INDEX_LINK.pack(self.last_index) + entries.tobytes())
+        self.pending = []
+        self.file.flush()
+
+    def write_readings(self, readings):
+        # a batch of serial_reader.Reading
+        if not readings:
+            return
+        records = np.array([(r.timestamp, r.sensor_id, r.light,
+                             0 if r.seq is None else r.seq, RECORD_NO_SEQ if r.seq is None else 0)
+                            for r in readings], dtype=READING_DTYPE)
+        self._append(KIND_READINGS, float(records['t'][0]), records.tobytes())
+
+    def write_layout(self, t, ids, positions, active):
+        # sensor centres by mote id (-1 for sensors placed by hand); only written when it changed
+        layout = np.zeros(len(ids), dtype=LAYOUT_DTYPE)
+        layout['id'] = [-1 if sensor_id is None else sensor_id for sensor_id in ids]
+        layout['x'], layout['y'] = positions[:, 0], positions[:, 1]
+        layout['active'] = active
+        payload = layout.tobytes()
+        if payload != self._layout:
+            self._layout = payload
+            self._append(KIND_LAYOUT, t, payload)
+
+    def close(self):
+        if self.pending:
+            self._write_index()
+        if self.last_index != NO_INDEX:
+            self._write(KIND_FOOTER, 0.0, INDEX_LINK.pack(self.last_index))
+        self.file.close()
+
+
+class LogReplay:
+    # plays a capture back into a SensorRegistry, in place of DataSimulator. speed is the
+    # playback rate (1.0 real time, 10.0 ten times faster), None feeds max_batch readings
+    # per feed() call as fast as the caller asks. start skips that many seconds of the log
+    def __init__(self, path, speed=CAPTURE_REPLAY_SPEED, start=0.0, max_batch=256):
+        log = CaptureLog(path)
+        self.t0 = log.start_time + start
+        self.readings = log.readings(self.t0)
+        self.layouts = log.layouts(self.t0)
+        self.speed = speed
+        self.max_batch = max_batch
+        self.pos = 0
+        self.layout_pos = 0
+        self.origin = None
+
+    @property
+    def done(self):
+        return self.pos >= len(self.readings) and self.layout_pos >= len(self.layouts)
+
+    @property
+    def log_time(self):
+        # seconds into the log of the last fed reading
+        return float(self.readings['t'][self.pos - 1]) - self.t0 if self.pos else 0.0
+
+    def _ingest(self, registry, start, stop, now):
+        if stop > start:
+            chunk = self.readings[start:stop]
+            registry.ingest(chunk['id'].tolist(), chunk['light'], now)
+
+    def _apply_layout(self, registry, layout, now):
+        for sensor_id, x, y, active in layout.tolist():
+            if sensor_id < 0:
+                continue
+            slot = registry.slot_of(sensor_id)
+            if slot is None:
+                registry.add((x, y), now, sensor_id, bool(active))
+            else:
+                # the views read both back from the registry, moves and toggles show up as recorded
+                registry.move(slot, (x, y))
+                registry.set_active(slot, bool(active))
+
+    def feed(self, registry, now):
+        # ingest everything due by registry time now (ms), in log order. returns readings fed
+        if self.origin is None:
+            self.origin = now
+        times = self.readings['t']
+        if self.speed:
+            until = self.t0 + (now - self.origin) / 1000.0 * self.speed
+            stop = int(np.searchsorted(times, until, side='right'))
+        else:
+            stop = min(self.pos + self.max_batch, len(times))
+            until = times[stop - 1] if stop < len(times) else np.inf
+
+        start = self.pos
+        while self.layout_pos < len(self.layouts) and self.layouts[self.layout_pos][0] <= until:
+            t, layout = self.layouts[self.layout_pos]
+            split = min(max(int(np.searchsorted(times, t, side='right')), start), stop)
+            self._ingest(registry, start, split, now)
+            self._apply_layout(registry, layout, now)
+            start = split
+            self.layout_pos += 1
+        self._ingest(registry, start, stop, now)
+
+        fed, self.pos = stop - self.pos, stop
+        return fed
@@ -1,29 +1,119 @@
-import pandas as pd
+import hashlib
+import json
+import os
+
 import numpy as np
 
+from settings import SENSOR_SIZE, SIMULATION_POSITIONS
+
 MAX_COUNT = 4
+# ticks skipped at the start of the recording
+OFFSET = 1200
+
+
+def _file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _read_workbook(excel_path):
+    # pandas / openpyxl are only needed when the cache has to be rebuilt
+    import pandas as pd
+
+    df = pd.read_excel(excel_path, sheet_name='data')
+    sensor_ids = sorted(int(s) for s in df['sensor_id'].unique())
+    columns = [df.loc[df['sensor_id'] == sensor, 'light'].to_numpy(dtype=float) for sensor in sensor_ids]
+
+    # one row per tick, one column per sensor, NaN once a sensor runs out of samples
+    light = np.full((max(len(c) for c in columns), len(sensor_ids)), np.nan)
+    for col, values in enumerate(columns):
+        light[:len(values), col] = values
+    return sensor_ids, light
+
+
+def load_light_table(excel_path):
+    # the workbook is converted once into <excel_path>.cache.npy (+ .cache.json with the source
+    # mtime / size / hash), later launches memory-map the .npy instead of parsing the xlsx
+    cache_path = excel_path + '.cache.npy'
+    meta_path = excel_path + '.cache.json'
+    stat = os.stat(excel_path)
+
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        fresh = meta['mtime_ns'] == stat.st_mtime_ns and meta['size'] == stat.st_size
+        if not fresh and meta['size'] == stat.st_size and meta['sha256'] == _file_hash(excel_path):
+            # touched but not changed, just remember the new mtime
+            meta['mtime_ns'] = stat.st_mtime_ns
+            _write_json(meta_path, meta)
+            fresh = True
+        if fresh:
+            return meta['sensor_ids'], np.load(cache_path, mmap_mode='r')
+    except (FileNotFoundError, ValueError, KeyError, OSError):
+        pass
+
+    sensor_ids, light = _read_workbook(excel_path)
+    meta = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+            'sha256': _file_hash(excel_path), 'sensor_ids': sensor_ids}
+    try:
+        tmp_path = cache_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, light)
+        os.replace(tmp_path, cache_path)
+        _write_json(meta_path, meta)
+    except OSError as e:
+        print(f"Could not write simulator cache: {e}")
+    return sensor_ids, light
+
+
+def _write_json(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
 
 class DataSimulator:
-    def __init__(self, excel_path):
-        df = pd.read_excel(excel_path, sheet_name='data')
-        self.sensor_ids = sorted(df['sensor_id'].unique())
-        self.light_lists = [
-            df[df['sensor_id'] == sensor]['light'].tolist() for sensor in self.sensor_ids
-        ]
+    def __init__(self, excel_path, offset=OFFSET, max_count=MAX_COUNT, seed=None, centres=None):
+        self.sensor_ids, self.light = load_light_table(excel_path)
+        # where the recorded motes sit, by column (default: centres of SIMULATION_POSITIONS)
+        if centres is None:
+            centres = np.array(SIMULATION_POSITIONS, dtype=float) + SENSOR_SIZE // 2
+        self.centres = np.asarray(centres, dtype=float)[:max_count]
+        self.offset = offset
+        self.max_count = max_count
+        self.rng = np.random.default_rng(seed)
+
+    @property
+    def tick_count(self):
+        # ticks that still have recorded data, after that everything is random filler
+        return max(len(self.light) - self.offset, 0)
+
+    def get_window(self, start, stop):
+        # (stop - start, max_count) array of readings, NaN where a sensor has no sample
+        rows = np.arange(start, stop) + self.offset
+        window = np.full((len(rows), self.max_count), np.nan)
+        valid = (rows >= 0) & (rows < len(self.light))
+        width = min(self.max_count, self.light.shape[1])
+        window[valid, :width] = self.light[rows[valid], :width]
+
+        # randomly generate data if running out!
+        short = np.count_nonzero(~np.isnan(window), axis=1) < 2
+        count = np.count_nonzero(short)
+        if count:
+            window[short] = np.nan
+            window[short, 0] = self.rng.uniform(20, 30, count)
+            window[short, 1] = self.rng.uniform(30, 40, count)
+        return window
+
+    def iter_chunks(self, chunk_size=1024, start=0, stop=None):
+        # yields (first tick, window) pairs, by default over the recorded data only
+        stop = self.tick_count if stop is None else stop
+        for chunk_start in range(start, stop, chunk_size):
+            yield chunk_start, self.get_window(chunk_start, min(chunk_start + chunk_size, stop))
 
     def get_light_values(self, index):
-        result = []
-        active_sensor_count = 0
-        for light_list in self.light_lists[:MAX_COUNT]:
-            if index + 1200 < len(light_list):
-                result.append(light_list[index + 1200])
-                active_sensor_count += 1
-            else:
-                result.append(None)
-
-        if active_sensor_count < 2:
-            # randomly generate data if running out!
-            result = [np.random.uniform(20, 30), np.random.uniform(30, 40)] + [None] * (MAX_COUNT - 2)
-            return tuple(result)
-
-        return tuple(result)
+        return tuple(None if np.isnan(v) else float(v) for v in self.get_window(index, index + 1)[0])
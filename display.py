@@ -1,42 +1,33 @@
 import json
+import time
 import pygame as pg
 import numpy as np
-from scipy.optimize import minimize
-from itertools import combinations
-import serial
 import serial.tools.list_ports
-from data_simulator import DataSimulator
-
-import re
+from capture import CaptureWriter, LogReplay
+from scheduler import SimulationScheduler
+from synthetic import open_simulator
+from multi_sink import MultiSinkReader, detect_sink_ports
+from sensor_registry import SensorRegistry
+from estimator import estimate, estimate_sources
+from estimator_worker import EstimatorWorker
+from estimate_cache import EstimateCache
+from calibration import PathLossCalibrator
+from grid_solver import field_cache
+from overlay import ObjectiveOverlay
+from profiler import FrameProfiler
+from tracking import MultiSourceEstimator, SourceTracker
+import render_cache
+from strokes import StrokeLayer, sidecar_path
 
 
 from settings import *
 
-def estimate_source(sensors, sliders):
-    # centres and readings -----------------------------------------------
-    positions = [(s.x + s.width//2, s.y + s.height//2) for s in sensors]
-    readings  = np.array([sl.value for sl in sliders], dtype=float)
-    logs      = np.log(readings + EPS)                 # avoid log(0)
-
-    # initial guess -------------------------------------------------------
-    x0, y0 = np.mean([p[0] for p in positions]), np.mean([p[1] for p in positions])
-
-    # objective using all unordered pairs --------------------------------
-    pairs = list(combinations(range(len(positions)), 2))
-
-    def error(pt):
-        x, y = pt
-        total = 0.0
-        for i, j in pairs:
-            di = np.hypot(x - positions[i][0], y - positions[i][1]) + EPS
-            dj = np.hypot(x - positions[j][0], y - positions[j][1]) + EPS
-            lhs = logs[i] - logs[j]
-            rhs = 2.0 * (np.log(dj) - np.log(di))
-            total += (lhs - rhs) ** 2
-        return total
-
-    res = minimize(error, (x0, y0))
-    return tuple(map(int, res.x))
+def load_strokes(stroke_layer, state):
+    # strokes live in the binary sidecar, older state.json files still carry them inline
+    try:
+        stroke_layer.load(sidecar_path('state.json'))
+    except FileNotFoundError:
+        stroke_layer.load_strokes(state.get('strokes', []))
 
 class Map:
     def __init__(self, width, height):
@@ -53,47 +44,82 @@ class Map:
         pass
 
 class Sensor:
-    def __init__(self, x, y, width, height, active=False, sensor_id=None):
-        self.x = x
-        self.y = y
+    # position, activity and the smoothed reading live in the registry arrays at self.slot,
+    # a sensor owns its slider and toggle switch
+    def __init__(self, x, y, width, height, active=False, sensor_id=None, registry=None, slot=None):
         self.width = width
         self.height = height
-        self.rect = pg.Rect(x, y, width, height)
-        self.active = active
-        self.id = sensor_id
+        self.registry = registry
+        if slot is None:
+            # registry time, not pygame's: in simulation the scheduler's clock drives expiry
+            slot = registry.add((x + width // 2, y + height // 2), registry.now, sensor_id, active)
+        self.slot = slot
+        self.id = registry.ids[slot]
+        self.slider = SensorSlider(self)
+        self.toggle = SensorToggleSwitch(self)
+
+    @property
+    def x(self):
+        return int(self.registry.positions[self.slot, 0]) - self.width // 2
+
+    @x.setter
+    def x(self, value):
+        self.registry.positions[self.slot, 0] = value + self.width // 2
+
+    @property
+    def y(self):
+        return int(self.registry.positions[self.slot, 1]) - self.height // 2
+
+    @y.setter
+    def y(self, value):
+        self.registry.positions[self.slot, 1] = value + self.height // 2
+
+    @property
+    def rect(self):
+        # drag hit-box, follows the registry wherever the position came from (drag, replay)
+        return pg.Rect(self.x, self.y, self.width, self.height)
+
+    @property
+    def active(self):
+        return bool(self.registry.active[self.slot])
+
+    @active.setter
+    def active(self, value):
+        self.registry.set_active(self.slot, value)
 
     def draw(self, screen):
         color = map_sensor_active_color if self.active else map_sensor_inactive_color
-        pg.draw.circle(screen, color, (self.x + self.width // 2, self.y + self.height // 2), self.width // 2)
+        dirty = pg.draw.circle(screen, color, (self.x + self.width // 2, self.y + self.height // 2), self.width // 2)
 
         if self.id is not None:
-            font = pg.font.Font(None, 28)
-            label = font.render(str(self.id), True, (255, 255, 255))
-            screen.blit(label, label.get_rect(center=(self.x + self.width // 2, self.y - self.height * 1.5)))
+            label = render_cache.text(str(self.id), 28, (255, 255, 255))
+            dirty = dirty.union(screen.blit(label, label.get_rect(center=(self.x + self.width // 2, self.y - self.height * 1.5))))
+        return dirty
 
 
 class SensorSlider:
     def __init__(self, sensor):
         self.sensor = sensor
-        # self.value = (max_val - min_val) // 2
-        self.value = 10
         self.width = 200
         self.height = 10
-        self.bar_rect = pg.Rect(sensor.x - (self.width / 2) + 10,
-                                 sensor.y + 40, self.width, self.height)
-        
-        self.last_time_updated = pg.time.get_ticks()
 
-        self.past_values = []
+    @property
+    def bar_rect(self):
+        return pg.Rect(self.sensor.x - (self.width / 2) + 10, self.sensor.y + 40, self.width, self.height)
+
+    @property
+    def value(self):
+        return self.sensor.registry.values[self.sensor.slot]
+
+    @value.setter
+    def value(self, value):
+        self.sensor.registry.values[self.sensor.slot] = value
 
     def draw(self, screen, debug_mode, C):
-        pg.draw.rect(screen, (150, 150, 150), self.bar_rect)
+        dirty = pg.draw.rect(screen, (150, 150, 150), self.bar_rect)
         # Calculate slider_x based on value (left to right)
         slider_x = self.bar_rect.x + int((self.value - MIN_SENSOR_STRENGTH) / (MAX_SENSOR_STRENGTH - MIN_SENSOR_STRENGTH) * self.width)
-        pg.draw.rect(screen, (255, 100, 100), (slider_x - 4, self.bar_rect.y - 2, 8, self.height + 4))
-
-        if self.last_time_updated + SENSOR_INACTIVE_TIMEOUT < pg.time.get_ticks():
-            self.sensor.active = False
+        dirty = dirty.union(pg.draw.rect(screen, (255, 100, 100), (slider_x - 4, self.bar_rect.y - 2, 8, self.height + 4)))
 
         if debug_mode and self.sensor.active:
             center_x = self.sensor.x + self.sensor.width // 2
@@ -104,8 +130,9 @@ class SensorSlider:
 
             # pixel scale ‘C’ computed once per frame and passed in
             radius   = int(C * inv_sqrt)
-            pg.draw.circle(screen, (15, 105, 205),
-                        (center_x, center_y), radius, 3)
+            dirty = dirty.union(pg.draw.circle(screen, (15, 105, 205),
+                                (center_x, center_y), radius, 3))
+        return dirty
 
 
     def handle_event(self, event):
@@ -123,16 +150,7 @@ class SensorSlider:
         self.value = int(MIN_SENSOR_STRENGTH + ratio * (MAX_SENSOR_STRENGTH - MIN_SENSOR_STRENGTH))
 
     def set_new_value(self, new_value):
-        
-        self.last_time_updated = pg.time.get_ticks()
-        self.past_values.append(new_value)
-        self.sensor.active = True
-        
-        if len(self.past_values) > PAST_VALUE_SMOOTHING_WINDOW:
-            self.past_values.pop(0)
-
-        # update the value
-        self.value = np.mean(self.past_values)
+        self.sensor.registry.update([self.sensor.slot], [new_value], self.sensor.registry.now)
 
 class AddSensorButton:
     def __init__(self, x, y, width, height):
@@ -141,16 +159,14 @@ class AddSensorButton:
 
     def draw(self, screen):
         pg.draw.rect(screen, self.color, self.rect)
-        font = pg.font.Font(None, 36)
-        text = font.render("Add Sensor", True, (255, 255, 255))
+        text = render_cache.text("Add Sensor", 36, (255, 255, 255))
         text_rect = text.get_rect(center=self.rect.center)
         screen.blit(text, text_rect)
+        return self.rect
 
-    def handle_event(self, event, sensors, sliders):
+    def handle_event(self, event, registry, sensors):
         if event.type == pg.MOUSEBUTTONDOWN and self.rect.collidepoint(event.pos):
-            new_sensor = Sensor(150, 150, 20, 20)
-            sensors.append(new_sensor)
-            sliders.append(SensorSlider(new_sensor))
+            sensors.append(Sensor(150, 150, SENSOR_SIZE, SENSOR_SIZE, registry=registry))
 
 class ToggleDebugModeButton:
     def __init__(self, x, y, width, height):
@@ -179,10 +195,10 @@ class ToggleDebugModeButton:
             self.current_color = self.active_color if self.debug_enabled else self.inactive_color
 
         pg.draw.rect(screen, self.current_color, self.rect)
-        font = pg.font.Font(None, 36)
-        text = font.render("Toggle Debug", True, (255, 255, 255))
+        text = render_cache.text("Toggle Debug", 36, (255, 255, 255))
         text_rect = text.get_rect(center=self.rect.center)
         screen.blit(text, text_rect)
+        return self.rect
 
     def handle_event(self, event):
         current_time = pg.time.get_ticks()
@@ -225,11 +241,11 @@ class ToggleDrawModeButton:
             self.current_color = self.active_color if self.draw_enabled else self.inactive_color
 
         pg.draw.rect(screen, self.current_color, self.rect)
-        font = pg.font.Font(None, 36)
-        text = font.render("Pencil mode", True, 
-                           self.active_text_color if self.draw_enabled else self.inactive_text_color)
+        text = render_cache.text("Pencil mode", 36,
+                                 self.active_text_color if self.draw_enabled else self.inactive_text_color)
         text_rect = text.get_rect(center=self.rect.center)
         screen.blit(text, text_rect)
+        return self.rect
 
     def handle_event(self, event):
         current_time = pg.time.get_ticks()
@@ -250,7 +266,6 @@ class SensorToggleSwitch:
         self.height = 40
         self.offset_x = offset_x
         self.offset_y = offset_y
-        self.rect = pg.Rect(0, 0, self.width, self.height)
         self.cooldown_ms = 300
         self.last_toggle_time = 0
         self.active_color = (0, 200, 0)
@@ -258,14 +273,11 @@ class SensorToggleSwitch:
         self.cooldown_color = (100, 100, 100)
         self.current_color = self.inactive_color
 
-    def update_position(self):
-        self.rect.topleft = (
-            self.sensor.x + self.offset_x,
-            self.sensor.y + self.offset_y
-        )
+    @property
+    def rect(self):
+        return pg.Rect(self.sensor.x + self.offset_x, self.sensor.y + self.offset_y, self.width, self.height)
 
     def draw(self, screen):
-        self.update_position()
         now = pg.time.get_ticks()
         elapsed = now - self.last_toggle_time
         progress = min(elapsed / self.cooldown_ms, 1.0)
@@ -276,11 +288,10 @@ class SensorToggleSwitch:
         b = int(self.cooldown_color[2] + (target_color[2] - self.cooldown_color[2]) * progress)
         self.current_color = (r, g, b)
 
-        temp_surface = pg.Surface((self.width, self.height), pg.SRCALPHA)
         color_with_alpha = (*self.current_color, int(255 * 0.3))
-        temp_surface.fill(color_with_alpha)
-        screen.blit(temp_surface, self.rect.topleft)
+        screen.blit(render_cache.filled((self.width, self.height), color_with_alpha), self.rect.topleft)
         pg.draw.rect(screen, (255, 255, 255), self.rect, 1)
+        return self.rect
 
     def handle_event(self, event):
         now = pg.time.get_ticks()
@@ -301,83 +312,125 @@ class LightPoint:
         self.pulse_start_time = pg.time.get_ticks()
         self.cycle_duration = 3500
 
+        # every source the estimator found, (x, y) is the strongest one
+        self.sources = [(x, y)]
+
     def update(self, new_x, new_y, new_strength):
         self.x = new_x
         self.y = new_y
+        self.sources = [(new_x, new_y)]
+
+    def update_sources(self, sources):
+        self.x, self.y = sources[0]
+        self.sources = list(sources)
 
     def draw(self, screen):
         color = (255, 255, 0)
-        pg.draw.circle(screen, color, (self.x, self.y), self.center_width)
-
-        # Pulsing rings
         now = pg.time.get_ticks()
         elapsed = (now - getattr(self, "pulse_start_time", now)) % self.cycle_duration
         num_rings = 4
         max_radius = 50
-        for i in range(num_rings):
-            # Each ring is offset in time
-            t = ((elapsed + i * (self.cycle_duration / num_rings)) % self.cycle_duration) / self.cycle_duration
-            radius = int(20 + t * max_radius)
-            alpha = int(120 * (1 - t))
-            if alpha <= 0:
-                continue
-            ring_surf = pg.Surface((radius * 2, radius * 2), pg.SRCALPHA)
-            pg.draw.circle(ring_surf, (255, 255, 0, alpha), (radius, radius), radius, 4)
-            screen.blit(ring_surf, (self.x - radius, self.y - radius))
+        sheet = render_cache.pulse_sheet(color, 20, max_radius, 120)
+
+        dirty = None
+        for pos in self.sources:
+            rect = pg.draw.circle(screen, color, pos, self.center_width)
+            dirty = rect if dirty is None else dirty.union(rect)
+            # Pulsing rings, blitted from a pre-rendered sprite sheet
+            for i in range(num_rings):
+                # Each ring is offset in time
+                t = ((elapsed + i * (self.cycle_duration / num_rings)) % self.cycle_duration) / self.cycle_duration
+                dirty = dirty.union(sheet.blit(screen, pos, t))
+        return dirty
+
+def add_sensor_views(registry, sensors):
+    # ui objects for motes the registry picked up since the last call, sensors[slot] is slot's sensor
+    for slot in range(len(sensors), len(registry)):
+        sensors.append(Sensor(0, 0, SENSOR_SIZE, SENSOR_SIZE, registry=registry, slot=slot))
+
+def draw_estimate_age(screen, latest_estimate):
+    if latest_estimate is None:
+        text = "estimate: waiting"
+    else:
+        age_ms = (time.perf_counter() - latest_estimate.published_at) * 1000
+        text = f"estimate age: {age_ms:.0f} ms"
+    label = render_cache.text(text, 24, (180, 180, 180))
+    return screen.blit(label, (10, HEIGHT - 30))
+
+def profile_lines(profiler, estimator_worker, solver, estimate_cache, calibrator):
+    # (label, value) rows of the profiling hud
+    lines = [(name, f"{ms:.2f} ms") for name, ms in profiler.averages().items()]
+    solves = list(estimator_worker.solve_log)
+    if solves:
+        lines.append(("solve", f"{sum(end - start for start, end in solves) / len(solves) * 1000:.2f} ms"))
+    lines.append(("solves", f"{solver.solves}, {solver.iterations / max(solver.solves, 1):.1f} evals each"))
+    if hasattr(solver, "skipped"):
+        lines.append(("skipped", f"{solver.skipped}"))
+    if hasattr(solver, "k"):
+        lines.append(("sources", f"{solver.k}"))
+    lines.append(("cache", f"{estimate_cache.hits} hits, {estimate_cache.misses} misses"))
+    if CALIBRATION:
+        lines.append(("exponent", f"{calibrator.exponent:.2f}, {calibrator.updates} updates"))
+    return lines
+
+def draw_profile_hud(screen, lines):
+    x, y, row = 10, 70, 18
+    dirty = screen.blit(render_cache.filled((230, row * len(lines) + 10), (0, 0, 0, 170)), (x, y))
+    for i, (label, value) in enumerate(lines):
+        screen.blit(render_cache.text(label, 20, (180, 180, 180)), (x + 5, y + 5 + i * row))
+        screen.blit(render_cache.text(value, 20, (255, 255, 255)), (x + 105, y + 5 + i * row))
+    return dirty
 
 def main():
     pg.init()
     screen = pg.display.set_mode((WIDTH, HEIGHT))
     pg.display.set_caption("Sensor Map")
     clock = pg.time.Clock()
-    tick = 0
-    data_simulator = DataSimulator('simulated_data.xlsx') if SIMULATION_MODE else None
+    data_simulator = capture_replay = scheduler = None
+    if SIMULATION_MODE and CAPTURE_REPLAY_PATH:
+        capture_replay = LogReplay(CAPTURE_REPLAY_PATH, CAPTURE_REPLAY_SPEED)
+    elif SIMULATION_MODE:
+        data_simulator = open_simulator(SIMULATION_DATA, seed=SIMULATION_SEED)
+        # which samples are due is decided by the scheduler, not by the frame rate
+        scheduler = SimulationScheduler()
+
+    # all sensor state lives here, sensors[slot] is the ui side of each slot
+    registry = SensorRegistry()
+    # path-loss exponent and per-mote gains, learned from the estimates
+    calibrator = PathLossCalibrator()
+
+    # pencil layer, undo replays from the nearest raster checkpoint
+    stroke_layer = StrokeLayer((WIDTH, HEIGHT))
 
     # -- PREVIOUS MAP STATE LOADING --
     try:
         if SENSOR_MODE:
-            sensors, sliders = [], []
-            draw_surf = pg.Surface((WIDTH, HEIGHT), pg.SRCALPHA)
+            sensors = []
             # small block for strokes on sensor mode
             try:
                 with open('state.json') as f:
                     state = json.load(f)
-                strokes = state['strokes']
-                # redraw saved strokes
-                for stroke in strokes:
-                    for i in range(1, len(stroke)):
-                        pg.draw.line(draw_surf, (200,200,200), stroke[i-1], stroke[i], 2)
+                load_strokes(stroke_layer, state)
             except FileNotFoundError:
-                strokes = []
+                pass
         
         elif not SIMULATION_MODE:
             with open('state.json') as f:
                 state = json.load(f)
                 
-            sensors = [Sensor(**d) for d in state['sensors']]
-            sliders = []
-            for s, d in zip(sensors, state['sliders']):
-                sl = SensorSlider(s)
-                # sl.value = d['value']
-                sliders.append(sl)
-            draw_surf = pg.Surface((WIDTH, HEIGHT), pg.SRCALPHA)
-            strokes = state['strokes']
-            # redraw saved strokes
-            for stroke in strokes:
-                for i in range(1, len(stroke)):
-                    pg.draw.line(draw_surf, (200,200,200), stroke[i-1], stroke[i], 2)
+            sensors = [Sensor(**d, registry=registry) for d in state['sensors']]
+            calibrator.load(state.get('calibration'), registry.slot_of)
+            # for s, d in zip(sensors, state['sliders']):
+            #     s.slider.value = d['value']
+            load_strokes(stroke_layer, state)
         else:
-            sensors, sliders, strokes = [], [], []
-            draw_surf = pg.Surface((WIDTH, HEIGHT), pg.SRCALPHA)
+            sensors = []
 
     except FileNotFoundError:
         # fallback to defaults
-        sensors = [Sensor(100,100,20,20,True),
-                   Sensor(200,200,20,20,True),
-                   Sensor(300,100,20,20,True)]
-        sliders = [SensorSlider(s) for s in sensors]
-        draw_surf = pg.Surface((WIDTH, HEIGHT), pg.SRCALPHA)
-        strokes = []
+        sensors = [Sensor(100,100,20,20,True, registry=registry),
+                   Sensor(200,200,20,20,True, registry=registry),
+                   Sensor(300,100,20,20,True, registry=registry)]
     m = Map(WIDTH, HEIGHT)
     m.map.fill(map_bg_color)
 
@@ -388,18 +441,53 @@ def main():
     # enables user to draw the scenery / room design on the map
     draw_mode = True 
     draw_mode = False
-    current = []
     dragged_sensor = None
     running = True
+    # for DIRTY_RECT_MODE: rects drawn last frame, and whether the next frame must be pushed whole
+    screen_rect = screen.get_rect()
+    previous_dirty = []
+    full_redraw = True
 
     # -- PYGAME OBJECTS AND STUFF --
 
-    sliders = [SensorSlider(s) for s in sensors]
     add_sensor_button = AddSensorButton(10, 10, 200, 50)
     toggle_debug_button = ToggleDebugModeButton(WIDTH - 20 - 200, 10, 200, 50)
     toggle_draw_button = ToggleDrawModeButton(WIDTH - 20 - 200, 70, 200, 50)
-    sensor_toggles = [SensorToggleSwitch(s) for s in sensors]
     light_point = LightPoint(0, 0, 0)
+    overlay = ObjectiveOverlay()
+    overlay_shown = False
+    estimated_pos = (light_point.x, light_point.y)
+    calibrated_at = None
+
+    # -- ESTIMATOR --
+
+    # solves run on a background thread so a slow one never stalls the frame,
+    # the tracker smooths the light's motion and warm starts each solve,
+    # with MAX_SOURCES > 1 the multi-source fit warm starts from the last frame instead
+    # snapshots that come back (a parked light, a replayed capture) are answered from the
+    # cache, underneath the tracker so it still predicts and corrects every frame
+    if MAX_SOURCES > 1:
+        estimate_cache = EstimateCache(estimate_sources)
+        solver = MultiSourceEstimator(estimate=estimate_cache)
+    else:
+        estimate_cache = EstimateCache(estimate)
+        solver = SourceTracker(estimate=estimate_cache)
+    estimator_worker = EstimatorWorker(solve=solver.step, reset=solver.reset)
+    estimator_worker.start()
+    active_slots = None
+
+    def layout_changed():
+        # cached distance fields, estimates and the tracker's state belong to the old geometry
+        field_cache.invalidate()
+        estimate_cache.invalidate()
+        estimator_worker.reset()
+
+    # -- PROFILING --
+
+    profiler = FrameProfiler()
+    show_hud = PROFILE_HUD
+    hud_lines, hud_updated = [], 0
+    traced_solve = 0.0
 
     # -- RECIEVER -- 
 
@@ -409,88 +497,57 @@ def main():
         print(p.device)
 
 
-    try:
-        # ser = serial.Serial('COM3', 38400, timeout=0)
-        # print("Serial port COM3 opened successfully.")
-        ser = serial.Serial('/dev/ttyUSB0', 38400, timeout=0)
-        print("Serial port /dev/ttyUSB0 opened successfully.")  
-    except serial.SerialException as e:
-        print(f"Error opening serial port: {e}")
-        print("Running basic mode.")
-        ser = None
+    serial_reader = None
+    if not SIMULATION_MODE:
+        # every sink gets its own reader thread, readings are merged and deduplicated on drain
+        if SERIAL_PORTS == "auto":
+            sink_ports = detect_sink_ports()
+        else:
+            sink_ports = SERIAL_PORTS or [SERIAL_PORT]
+        # sink_ports = ['COM3']
+        serial_reader = MultiSinkReader(sink_ports, SERIAL_BAUDRATE)
+        if serial_reader.readers:
+            serial_reader.start()
+            print(f"Serial ports {', '.join(serial_reader.ports)} opened successfully.")
+        else:
+            serial_reader = None
+            print("Running basic mode.")
+
+    capture = None
+    if serial_reader and CAPTURE_PATH:
+        capture = CaptureWriter(time.strftime(CAPTURE_PATH))
+        print(f"Capturing serial traffic to {capture.path}")
 
-    
-    serial_buffer = ""
     while running:
-        # -- READ DATA FROM THE MOTES --
-        if ser and not SIMULATION_MODE:
-            serial_buffer += ser.read(ser.in_waiting or 1).decode('ascii', 'ignore')
-            while '<START>' in serial_buffer and '<END>' in serial_buffer:
-                start = serial_buffer.find('<START>') + len('<START>')
-                end   = serial_buffer.find('<END>', start)
-                if end == -1:
-                    break
-
-                frame = serial_buffer[start:end] # e.g. "DEBUG_INFO=SENSOR_DATA, ID=17, Light=645, Seq=3"
-                serial_buffer = serial_buffer[end + len('<END>'):]
-
-                pattern = re.search(
-                    r'DEBUG_INFO=([^,]+),\s*ID=(\d+),\s*Light=(\d+)(?:,\s*Seq=(\d+))?',
-                    frame
-                )
-                if not pattern:
-                    continue
-
-                debug_info = pattern.group(1) # string: SINK_DATA / SENSOR_DATA
-                sender_id  = int(pattern.group(2))
-                light      = int(pattern.group(3))
-                seq        = pattern.group(4)
-                seq        = int(seq) if seq is not None else None
-
-                print(f"Received {debug_info} from mote {sender_id}: "
-                    f"Light={light}" + (f", Seq={seq}" if seq is not None else ""))
-
-                # update sliders only for sensor frames
-                # if debug_info == "SENSOR_DATA":
-                sensor = next((s for s in sensors if s.id == sender_id), None)
-                if sensor is None:
-                    sensor = Sensor(150, 150, 20, 20, True, sender_id)
-                    sensors.append(sensor)
-                    sliders.append(SensorSlider(sensor))
-                    sensor_toggles.append(SensorToggleSwitch(sensor))
-
-                # update slider value
-                for sl in sliders:
-                    if sl.sensor.id == sender_id:
-                        # sl.value = light
-                        sl.set_new_value(light)
-        
+        profiler.frame()
 
-        if SIMULATION_MODE:
-            positions = [
-                [280, 180],
-                [WIDTH - 180, 180],
-                [WIDTH - 280, HEIGHT - 180],
-                [280, HEIGHT - 180],
-                [WIDTH // 2, HEIGHT // 2],
-            ]
-        
-            simulated_data = data_simulator.get_light_values(tick)
-            # print(f"Tick {tick}: Simulated data: {simulated_data}")
-            tick += 1
-            for idx, light in enumerate(simulated_data):
-                if light is None:
-                    continue
-                sensor = next((s for s in sensors if s.id == idx), None)
-                if sensor is None:
-                    x, y = positions[idx]
-                    sensor = Sensor(x, y, 20, 20, True, idx)
-                    sensors.append(sensor)
-                    sliders.append(SensorSlider(sensor))
-                    sensor_toggles.append(SensorToggleSwitch(sensor))
-                for sl in sliders:
-                    if sl.sensor.id == idx:
-                        sl.set_new_value(light)
+        # -- READ DATA FROM THE MOTES --
+        # the reader thread owns the port and parses frames, here we only take what is ready
+        now = pg.time.get_ticks()
+        if serial_reader:
+            readings = serial_reader.drain()
+            registry.ingest([r.sensor_id for r in readings], [r.light for r in readings], now)
+            if capture:
+                capture.write_readings(readings)
+            profiler.lap("serial")
+
+        if capture_replay:
+            layout_pos = capture_replay.layout_pos
+            capture_replay.feed(registry, now)
+            if capture_replay.layout_pos != layout_pos:
+                layout_changed()
+            profiler.lap("replay")
+        elif SIMULATION_MODE:
+            start, stop, now = scheduler.step(now)
+            if stop > start:
+                simulated_data = data_simulator.get_window(start, stop)
+                # print(f"Samples {start}-{stop}: Simulated data: {simulated_data}")
+                registry.ingest_rows(simulated_data, now, data_simulator.centres)
+            profiler.lap("simulator")
+
+        add_sensor_views(registry, sensors)
+        registry.expire(now)
+        profiler.lap("registry")
 
 
         # -- HANDLE VARIOUS EVENTS
@@ -498,29 +555,25 @@ def main():
         for event in pg.event.get():
             if event.type == pg.QUIT:
                 running = False
+            elif event.type == pg.WINDOWEXPOSED:
+                full_redraw = True
+            elif event.type == pg.KEYDOWN and event.key == pg.K_F3:
+                show_hud = not show_hud
+            elif event.type == pg.KEYDOWN and event.key == pg.K_F4 and profiler.trace is None:
+                profiler.start_trace(PROFILE_TRACE_FRAMES, time.strftime(PROFILE_TRACE_PATH))
 
             draw_mode = toggle_draw_button.handle_event(event)
             
             if draw_mode:
                 if event.type == pg.MOUSEBUTTONDOWN and event.button == 1:
-                    current = [event.pos]
+                    stroke_layer.begin(event.pos)
                 elif event.type == pg.MOUSEMOTION and getattr(event, "buttons", (0,))[0]:
-                    current.append(event.pos)
-                    if len(current) > 1:
-                        pg.draw.line(draw_surf, (200,200,200), current[-2], current[-1], 2)
+                    stroke_layer.extend(event.pos)
                 elif event.type == pg.MOUSEBUTTONUP and event.button == 1:
-                    if current:
-                        strokes.append(current)
-                        current = []
+                    stroke_layer.end()
                 
                 elif event.type == pg.KEYDOWN and event.key == pg.K_z and (event.mod & pg.KMOD_CTRL):
-                    if strokes:
-                        strokes.pop()
-                        # clear surface and redraw remaining strokes
-                        draw_surf.fill((0,0,0,0))
-                        for stroke in strokes:
-                            for i in range(1, len(stroke)):
-                                pg.draw.line(draw_surf, (200,200,200), stroke[i-1], stroke[i], 2)
+                    stroke_layer.undo()
             
                 continue  # Skip the rest of the button / key handling loop if in draw mode
 
@@ -529,77 +582,154 @@ def main():
                     if s.rect.collidepoint(event.pos):
                         dragged_sensor = s
             elif event.type == pg.MOUSEBUTTONUP:
+                if dragged_sensor:
+                    layout_changed()
                 dragged_sensor = None
             elif event.type == pg.MOUSEMOTION and dragged_sensor:
                 dragged_sensor.x, dragged_sensor.y = event.pos
-                dragged_sensor.rect.topleft = event.pos
-                for slider in sliders:
-                    if slider.sensor == dragged_sensor:
-                        slider.bar_rect.topleft = (dragged_sensor.x - (slider.width / 2) + 10,
-                                                   dragged_sensor.y + 40)
+                # cached distance fields and estimates are stale, the tracker starts over on release
+                field_cache.invalidate()
+                estimate_cache.invalidate()
 
-            for slider in sliders:
-                slider.handle_event(event)
+            for s in sensors:
+                s.slider.handle_event(event)
 
             
-            add_sensor_button.handle_event(event, sensors, sliders)
+            add_sensor_button.handle_event(event, registry, sensors)
             debug_mode = toggle_debug_button.handle_event(event)
-            if len(sensor_toggles) < len(sensors):
-                sensor_toggles.append(SensorToggleSwitch(sensors[-1]))
 
-            for toggle in sensor_toggles:
-                toggle.handle_event(event)
-
-        active_sensors = [s for s in sensors if s.active]
-        if len(active_sensors) >= 2:
-            estimated_pos = estimate_source(active_sensors, sliders)
+            for s in sensors:
+                s.toggle.handle_event(event)
+
+        if capture:
+            n = len(registry)
+            capture.write_layout(time.time(), registry.ids, registry.positions[:n], registry.active[:n])
+
+        profiler.lap("events")
+
+        slots = registry.active_slots()
+        # toggles, motes that showed up or went silent: a different set of sensors to fit
+        if active_slots is not None and not np.array_equal(slots, active_slots):
+            layout_changed()
+        active_slots = slots
+        positions, readings = registry.snapshot()
+        # the estimators assume identical motes and an inverse-square law
+        model_readings = calibrator.correct(slots, readings)
+        if len(slots) >= 2:
+            estimator_worker.publish(positions, model_readings)
+
+        latest_estimate = estimator_worker.latest()
+        if latest_estimate is not None:
+            estimated_pos = latest_estimate.position
             # pg.draw.circle(screen, (255, 205, 0), estimated_pos, 8)
-            light_point.update(estimated_pos[0], estimated_pos[1], MAX_SENSOR_STRENGTH)
+            light_point.update_sources(latest_estimate.sources)
+            # once per solve, the gains of several sources cannot be told apart
+            if (CALIBRATION and MAX_SOURCES == 1 and latest_estimate.solved_at != calibrated_at
+                    and len(slots) >= CALIBRATION_MIN_SENSORS):
+                calibrator.update(slots, positions, readings, estimated_pos)
+                calibrated_at = latest_estimate.solved_at
+
+        if profiler.trace is not None:
+            # solves finished on the estimator thread since the last frame
+            for started, finished in list(estimator_worker.solve_log):
+                if started > traced_solve:
+                    profiler.record("solve", started, finished, "estimator")
+                    traced_solve = started
+        profiler.lap("estimate")
+
+        # objective heat map behind everything in debug mode, rebuilt only when the readings
+        # or layout moved enough
+        if debug_mode and overlay.update(positions, model_readings, estimated_pos):
+            full_redraw = True
+        if debug_mode != overlay_shown:
+            overlay_shown = debug_mode
+            full_redraw = True
+        profiler.lap("overlay")
+
+        # at max speed most iterations only feed data, a frame is drawn now and then
+        if scheduler and not scheduler.should_render(pg.time.get_ticks()):
+            continue
 
         # -- DRAW --
 
         m.draw(screen)
-        screen.blit(draw_surf, (0,0))
+        if debug_mode:
+            overlay.draw_heat_map(screen)
+        screen.blit(stroke_layer.surface, (0,0))
+        profiler.lap("draw map")
+        dirty = [s.draw(screen) for s in sensors]
+        profiler.lap("draw sensors")
+
+        # Matching pixel scale:  C = mean( d_i * √R_i ), straight from the registry arrays
+        n = len(registry)
+        dists = np.hypot(*(registry.positions[:n] - estimated_pos).T)
+        C = np.mean(dists * np.sqrt(registry.values[:n] + 1e-9)) if n else 0.0
+
+        # Draw sliders with that single scale
         for s in sensors:
-            s.draw(screen)
-        raw_radii = [1/np.sqrt(sl.value + 1e-9) for sl in sliders]
-        reference_median_raw = np.median(raw_radii) or 1.0
-
-        dists = [np.hypot(s.x + s.width//2 - estimated_pos[0],
-                  s.y + s.height//2 - estimated_pos[1]) for s in sensors]
-
-        # 3. Matching pixel scale:  C = mean( d_i * √R_i )
-        C = np.mean([d * np.sqrt(sl.value + 1e-9)
-                    for d, sl in zip(dists, sliders)])
-
-        # 4. Draw sliders with that single scale
-        for sl in sliders:
-            sl.draw(screen, debug_mode, C)
-
-        for toggle in sensor_toggles:
-            toggle.draw(screen)
-        add_sensor_button.draw(screen)
-        toggle_debug_button.draw(screen)
-        toggle_draw_button.draw(screen)
-
-        light_point.draw(screen)
-
-        pg.display.flip()
-        clock.tick(60)
+            dirty.append(s.slider.draw(screen, debug_mode, C))
+        profiler.lap("draw sliders")
 
+        for s in sensors:
+            dirty.append(s.toggle.draw(screen))
+        dirty.append(add_sensor_button.draw(screen))
+        dirty.append(toggle_debug_button.draw(screen))
+        dirty.append(toggle_draw_button.draw(screen))
+        profiler.lap("draw widgets")
+
+        if debug_mode:
+            dirty.append(overlay.draw_ellipse(screen))
+        dirty.append(light_point.draw(screen))
+        dirty.append(draw_estimate_age(screen, latest_estimate))
+        if show_hud:
+            # numbers refresh a few times a second so they stay readable
+            if pg.time.get_ticks() - hud_updated > 250:
+                hud_lines, hud_updated = profile_lines(profiler, estimator_worker, solver, estimate_cache, calibrator), pg.time.get_ticks()
+            dirty.append(draw_profile_hud(screen, hud_lines))
+        profiler.lap("draw overlays")
+
+        if DIRTY_RECT_MODE and not full_redraw:
+            # only push what was drawn last frame (to erase it) and what is drawn now
+            pg.display.update([r.clip(screen_rect) for r in previous_dirty + dirty])
+        else:
+            pg.display.flip()
+        profiler.lap("present")
+        previous_dirty = dirty
+        # pencil strokes change the background layer, so push whole frames while drawing
+        full_redraw = draw_mode
+        clock.tick(0 if scheduler and scheduler.max_speed else 60)
+        profiler.lap("sleep")
+
+
+    estimator_worker.stop()
+    profiler.stop_trace()
+    if scheduler:
+        print(f"Simulation: {scheduler.next_sample} samples fed"
+              + (f", {scheduler.rendered} frames drawn, {scheduler.skipped} skipped" if scheduler.max_speed else ""))
+    print(f"Estimate cache: {estimate_cache.hits} hits, {estimate_cache.misses} misses")
+    if CALIBRATION:
+        print(f"Calibration: exponent {calibrator.exponent:.3f} after {calibrator.updates} updates")
+    print(f"Overlay: {overlay.rebuilds} heat maps built, {overlay.reuses} reused")
+    if serial_reader:
+        print(serial_reader.report())
+        serial_reader.close()
+    if capture:
+        print(f"Captured {capture.blocks} blocks to {capture.path}")
+        capture.close()
 
     # -- SAVE STATE --
     data = {
         'sensors': [
             {'x': s.x, 'y': s.y, 'width': s.width,
-             'height': s.height, 'active': s.active}
+             'height': s.height, 'active': s.active, 'sensor_id': s.id}
             for s in sensors
         ],
-        'sliders': [{'value': sl.value} for sl in sliders],
-        'strokes': strokes
+        'sliders': [{'value': float(s.slider.value)} for s in sensors],
+        'calibration': calibrator.state(registry.ids),
     }
     with open('state.json', 'w') as f:
         json.dump(data, f)
+    stroke_layer.save(sidecar_path('state.json'))
 
     pg.quit()
 
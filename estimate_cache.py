@@ -0,0 +1,50 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from grid_solver import layout_key
+from settings import EPS, ESTIMATE_CACHE_SIZE, ESTIMATE_CACHE_TOLERANCE
+
+
+class EstimateCache:
+    # bounded lru memo in front of a stateless solve(positions, readings, ...) such as
+    # estimator.estimate; stateful callers (the tracker) keep running every frame on top.
+    # the key is the layout plus the log readings quantized to `tolerance`; the mean log is
+    # taken out first since every estimator only looks at ratios between sensors, so a
+    # common gain change (all motes a bit brighter) still hits. further arguments (warm
+    # starts) are passed on to solve but are not part of the key
+    def __init__(self, solve, max_entries=ESTIMATE_CACHE_SIZE, tolerance=ESTIMATE_CACHE_TOLERANCE):
+        self.solve = solve
+        self.max_entries = max_entries
+        self.tolerance = tolerance
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        # solves run on the estimator thread, drags and toggles invalidate from the ui thread
+        self._lock = threading.Lock()
+
+    def key(self, positions, readings):
+        logs = np.log(np.asarray(readings, dtype=float) + EPS)
+        levels = np.round((logs - logs.mean()) / self.tolerance).astype(int)
+        return layout_key(positions), tuple(levels.tolist())
+
+    def __call__(self, positions, readings, *args, **kwargs):
+        key = self.key(positions, readings)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        result = self.solve(positions, readings, *args, **kwargs)
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = result
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
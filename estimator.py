@@ -0,0 +1,241 @@
+import numpy as np
+
+from grid_solver import grid_solve
+from settings import EPS, ESTIMATOR_MODE, MAX_SOURCES, SENSOR_SIZE, SOURCE_SELECTION_MARGIN, MULTI_SOURCE_MAX_NFEV
+
+
+def least_squares(*args, **kwargs):
+    # scipy.optimize takes ~0.3 s to import, so it is only loaded by the first solve
+    # that needs it (the grid estimator never does)
+    from scipy.optimize import least_squares
+    return least_squares(*args, **kwargs)
+
+
+def sensor_centres(sensors):
+    return np.array([(s.x + s.width // 2, s.y + s.height // 2) for s in sensors], dtype=float)
+
+
+def pair_indices(n):
+    # same unordered pairs (and order) as itertools.combinations(range(n), 2)
+    return np.triu_indices(n, k=1)
+
+
+def _offsets(pt, positions):
+    dx = pt[0] - positions[:, 0]
+    dy = pt[1] - positions[:, 1]
+    return dx, dy, np.hypot(dx, dy)
+
+
+def _log_distance_grad(dx, dy, r):
+    # d/dx log(r + EPS) = dx / (r * (r + EPS)), taken as 0 right on top of a sensor
+    scale = np.divide(1.0, r * (r + EPS), out=np.zeros_like(r), where=r > 0)
+    return dx * scale, dy * scale
+
+
+# -- PAIRWISE LOG-RATIO MODEL --
+# for every pair (i, j):  log R_i - log R_j = 2 * (log d_j - log d_i)
+
+def pairwise_residuals(pt, positions, logs, i, j):
+    _, _, r = _offsets(pt, positions)
+    log_d = np.log(r + EPS)
+    return (logs[i] - logs[j]) - 2.0 * (log_d[j] - log_d[i])
+
+
+def pairwise_jacobian(pt, positions, logs, i, j):
+    gx, gy = _log_distance_grad(*_offsets(pt, positions))
+    jac = np.empty((len(i), 2))
+    jac[:, 0] = 2.0 * (gx[i] - gx[j])
+    jac[:, 1] = 2.0 * (gy[i] - gy[j])
+    return jac
+
+
+def estimate_pairwise(positions, readings, x0=None):
+    positions = np.asarray(positions, dtype=float)
+    logs = np.log(np.asarray(readings, dtype=float) + EPS)  # avoid log(0)
+    if x0 is None:
+        x0 = positions.mean(axis=0)
+
+    i, j = pair_indices(len(positions))
+    # levenberg-marquardt needs at least as many residuals as unknowns
+    method = "lm" if len(i) >= 2 else "trf"
+    return least_squares(pairwise_residuals, x0, jac=pairwise_jacobian,
+                         args=(positions, logs, i, j), method=method)
+
+
+# -- FREE-AMPLITUDE MODEL --
+# one residual per sensor:  log R_i = log A - 2 * log d_i,  unknowns (x, y, log A)
+
+def amplitude_residuals(params, positions, logs):
+    _, _, r = _offsets(params, positions)
+    return logs - (params[2] - 2.0 * np.log(r + EPS))
+
+
+def amplitude_jacobian(params, positions, logs):
+    gx, gy = _log_distance_grad(*_offsets(params, positions))
+    jac = np.empty((len(positions), 3))
+    jac[:, 0] = 2.0 * gx
+    jac[:, 1] = 2.0 * gy
+    jac[:, 2] = -1.0
+    return jac
+
+
+def closed_form_guess(positions, readings):
+    # R_i = A / d_i^2  =>  2 x_i x + 2 y_i y + A / R_i - (x^2 + y^2) = x_i^2 + y_i^2,
+    # which is linear in (x, y, A, x^2 + y^2) and needs at least 4 sensors
+    positions = np.asarray(positions, dtype=float)
+    readings = np.asarray(readings, dtype=float)
+    centroid = positions.mean(axis=0)
+    if len(positions) < 4:
+        return centroid
+
+    a = np.column_stack((2.0 * positions, 1.0 / (readings + EPS), -np.ones(len(positions))))
+    b = np.sum(positions ** 2, axis=1)
+    sol, *_ = np.linalg.lstsq(a, b, rcond=None)
+    if not np.all(np.isfinite(sol)) or sol[2] <= 0:
+        return centroid
+    return sol[:2]
+
+
+def estimate_amplitude(positions, readings, x0=None):
+    positions = np.asarray(positions, dtype=float)
+    logs = np.log(np.asarray(readings, dtype=float) + EPS)
+    if x0 is None:
+        x0 = closed_form_guess(positions, readings)
+
+    # best log A for the starting point is just the mean residual
+    _, _, r = _offsets(x0, positions)
+    log_a = np.mean(logs + 2.0 * np.log(r + EPS))
+    method = "lm" if len(positions) >= 3 else "trf"
+    return least_squares(amplitude_residuals, (x0[0], x0[1], log_a), jac=amplitude_jacobian,
+                         args=(positions, logs), method=method)
+
+
+# -- MULTI-SOURCE MODEL --
+# readings are a sum of inverse-square sources:  R_i = sum_k A_k / d_ik^2,
+# unknowns (x_k, y_k, log A_k) per source. fitted in log space, for K = 1 it is the model above
+
+def _source_terms(params, positions):
+    sources = params.reshape(-1, 3)
+    # (sensors, sources)
+    dx = sources[:, 0] - positions[:, 0, None]
+    dy = sources[:, 1] - positions[:, 1, None]
+    r = np.hypot(dx, dy)
+    log_terms = sources[:, 2] - 2.0 * np.log(r + EPS)
+    # log of the summed light, shifted by the largest term so nothing overflows
+    peak = log_terms.max(axis=1)
+    log_total = peak + np.log(np.exp(log_terms - peak[:, None]).sum(axis=1))
+    return dx, dy, r, log_terms, log_total
+
+
+def multi_source_residuals(params, positions, logs):
+    *_, log_total = _source_terms(params, positions)
+    return logs - log_total
+
+
+def multi_source_jacobian(params, positions, logs):
+    dx, dy, r, log_terms, log_total = _source_terms(params, positions)
+    # share of each sensor's light that comes from each source
+    w = np.exp(log_terms - log_total[:, None])
+    gx, gy = _log_distance_grad(dx, dy, r)
+    jac = np.empty(w.shape + (3,))
+    jac[:, :, 0] = 2.0 * w * gx
+    jac[:, :, 1] = 2.0 * w * gy
+    jac[:, :, 2] = -w
+    return jac.reshape(len(positions), -1)
+
+
+def max_sources(n, limit=MAX_SOURCES):
+    # keep at least one residual spare so the fits can be compared
+    return max(min(limit, (n - 1) // 3), 1)
+
+
+def seed_source(params, positions, logs):
+    # one more source, next to the sensor that reads the most light the current fit misses
+    res = multi_source_residuals(params, positions, logs)
+    i = np.argmax(res)
+    excess = np.exp(logs[i]) - np.exp(logs[i] - res[i])
+    log_a = np.log(max(excess, EPS)) + 2.0 * np.log(np.hypot(SENSOR_SIZE, SENSOR_SIZE))
+    return np.r_[params, positions[i] + SENSOR_SIZE, log_a]
+
+
+def source_bic(res, n):
+    # bayesian information criterion of a fit, lower is better
+    rss = max(2.0 * res.cost, EPS)
+    return n * np.log(rss / n) + len(res.x) * np.log(n)
+
+
+def estimate_sources(positions, readings, x0=None, max_k=MAX_SOURCES, starts=None):
+    # fits K = 1 .. max_sources(n) sources and keeps the K with the lowest BIC (by at least
+    # SOURCE_SELECTION_MARGIN for every source added). x0 is an
+    # (x, y) start for the single source fit, starts maps K to a full warm start.
+    # result.x holds (x, y, log A) per source, strongest first, result.k the number of sources
+    positions = np.asarray(positions, dtype=float)
+    logs = np.log(np.asarray(readings, dtype=float) + EPS)
+    starts = starts or {}
+    fits, best = {}, None
+
+    for k in range(1, max_sources(len(positions), max_k) + 1):
+        start = starts.get(k)
+        if start is None and k == 1:
+            pt = closed_form_guess(positions, readings) if x0 is None else np.asarray(x0, dtype=float)
+            _, _, r = _offsets(pt, positions)
+            start = (pt[0], pt[1], np.mean(logs + 2.0 * np.log(r + EPS)))
+        elif start is None:
+            start = seed_source(fits[k - 1].x, positions, logs)
+
+        # capped: a source the readings do not support tends to wander instead of converging,
+        # and a good warm start needs a handful of evaluations anyway
+        method = "lm" if len(positions) >= 3 * k else "trf"
+        res = least_squares(multi_source_residuals, np.asarray(start, dtype=float), jac=multi_source_jacobian,
+                            args=(positions, logs), method=method, max_nfev=MULTI_SOURCE_MAX_NFEV)
+        res.bic = source_bic(res, len(positions))
+        fits[k] = res
+        if best is not None and res.bic >= best.bic - SOURCE_SELECTION_MARGIN:
+            # no more sources than the readings support
+            break
+        best = res
+
+    sources = best.x.reshape(-1, 3)
+    best.x = sources[np.argsort(-sources[:, 2])].ravel()
+    best.k = len(sources)
+    best.fits = fits
+    return best
+
+
+def position_covariance(pt, positions, readings):
+    # 2x2 covariance of the estimate at pt from the amplitude model's jacobian, with the
+    # residual variance as noise level. None when the sensors do not constrain it
+    positions = np.asarray(positions, dtype=float)
+    logs = np.log(np.asarray(readings, dtype=float) + EPS)
+    _, _, r = _offsets(pt, positions)
+    params = (pt[0], pt[1], np.mean(logs + 2.0 * np.log(r + EPS)))
+    res = amplitude_residuals(params, positions, logs)
+    jac = amplitude_jacobian(params, positions, logs)
+    noise = res @ res / max(len(positions) - 3, 1)
+    try:
+        cov = noise * np.linalg.inv(jac.T @ jac)[:2, :2]
+    except np.linalg.LinAlgError:
+        return None
+    return cov if np.all(np.isfinite(cov)) else None
+
+
+def fit_error(pt, positions, readings):
+    # rms misfit of the inverse-square model at pt with the best amplitude for it;
+    # both models above share their minimum with this, so it is mode independent
+    positions = np.asarray(positions, dtype=float)
+    _, _, r = _offsets(pt, positions)
+    c = np.log(np.asarray(readings, dtype=float) + EPS) + 2.0 * np.log(r + EPS)
+    return float(np.sqrt(np.mean((c - c.mean()) ** 2)))
+
+
+ESTIMATORS = {
+    "pairwise": estimate_pairwise,
+    "amplitude": estimate_amplitude,
+    "grid": grid_solve,
+    "multi": estimate_sources,
+}
+
+
+def estimate(positions, readings, mode=None, x0=None):
+    # result.x starts with the (x, y) estimate whatever the mode
+    return ESTIMATORS[mode or ESTIMATOR_MODE](positions, readings, x0=x0)
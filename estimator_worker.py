@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+
+from estimator import estimate
+from settings import PROFILE_WINDOW
+
+# published_at is when the readings were snapshotted, so now - published_at is
+# how stale the drawn estimate is. sources has every source found, position first
+Estimate = namedtuple("Estimate", ["position", "published_at", "solved_at", "sources"])
+
+
+def solve_position(positions, readings):
+    res = estimate(positions, readings)
+    return tuple(map(int, res.x[:2]))
+
+
+class EstimatorWorker:
+    def __init__(self, solve=solve_position, reset=None):
+        self.solve = solve
+        # clears the solver's state (tracker, warm starts), run on the worker thread
+        self.reset_solver = reset
+        self.dropped = 0
+        self.solved = 0
+        # perf_counter (start, end) of the recent solves, for the profiler
+        self.solve_log = deque(maxlen=PROFILE_WINDOW)
+        self._cond = threading.Condition()
+        # single slot mailbox: a newer snapshot replaces one the worker has not picked up yet
+        self._pending = None
+        self._latest = None
+        self._reset = False
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="estimator", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+
+    def publish(self, positions, readings):
+        # copy so the ui can keep mutating its own state
+        snapshot = (np.array(positions, dtype=float), np.array(readings, dtype=float), time.perf_counter())
+        with self._cond:
+            if self._pending is not None:
+                self.dropped += 1
+            self._pending = snapshot
+            self._cond.notify()
+
+    def reset(self):
+        # the layout changed: the solver starts over before its next solve, never mid-solve
+        with self._cond:
+            self._reset = True
+
+    def latest(self):
+        # never blocks, None until the first solve finishes
+        return self._latest
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and self._running:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                positions, readings, published_at = self._pending
+                self._pending = None
+                reset, self._reset = self._reset, False
+
+            started = time.perf_counter()
+            try:
+                if reset and self.reset_solver is not None:
+                    self.reset_solver()
+                result = self.solve(positions, readings)
+            except Exception as e:
+                print(f"Estimator failed: {e}")
+                continue
+            self.solve_log.append((started, time.perf_counter()))
+            # multi-source solvers return a list of positions, strongest first
+            sources = tuple(result) if isinstance(result, list) else (result,)
+            self._latest = Estimate(sources[0], published_at, time.perf_counter(), sources)
+            self.solved += 1
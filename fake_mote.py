@@ -0,0 +1,83 @@
+import argparse
+import os
+import time
+import tty
+
+import numpy as np
+
+from serial_reader import SYNC, RECORD_DTYPE, RECORD_NO_SEQ, frame_checksum
+
+# stand-in for a sink mote on a pseudo terminal, anything that opens .port
+# (pyserial, SerialReader, display.py via SERIAL_PORT) sees the sink's text or binary frames
+
+
+def format_frame(sensor_id, light, seq=None):
+    if seq is None:
+        return f"<START>DEBUG_INFO=SINK_DATA, ID={sensor_id}, Light={light}<END>\n".encode('ascii')
+    return f"<START>DEBUG_INFO=SENSOR_DATA, ID={sensor_id}, Light={light}, Seq={seq}<END>\n".encode('ascii')
+
+
+def format_binary_frame(readings):
+    # readings are (sensor_id, light, seq) with seq None for the sink's own samples
+    records = np.zeros(len(readings), dtype=RECORD_DTYPE)
+    for record, (sensor_id, light, seq) in zip(records, readings):
+        record['id'], record['light'] = sensor_id, light
+        if seq is None:
+            record['flags'] = RECORD_NO_SEQ
+        else:
+            record['seq'] = seq
+    body = bytes([len(readings)]) + records.tobytes()
+    return SYNC + body + bytes([frame_checksum(body)])
+
+
+class FakeMote:
+    def __init__(self):
+        self.master, self.slave = os.openpty()
+        # raw mode so the line discipline does not echo or translate anything
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+
+    def write(self, data):
+        os.write(self.master, data)
+
+    def send(self, sensor_id, light, seq=None):
+        self.write(format_frame(sensor_id, light, seq))
+
+    def send_batch(self, readings):
+        self.write(format_binary_frame(readings))
+
+    def close(self):
+        os.close(self.master)
+        os.close(self.slave)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="pretend to be a sink mote on a pty")
+    parser.add_argument("--sensors", type=int, default=4)
+    parser.add_argument("--interval", type=float, default=0.5, help="seconds between rounds of readings")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--binary", action="store_true", help="send batched binary frames like BINARY_OUTPUT firmware")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    mote = FakeMote()
+    print(f"Fake sink on {mote.port}, set SERIAL_PORT to it")
+    seq = 0
+    try:
+        while True:
+            seq = (seq + 1) % 256
+            readings = [(sensor_id, int(rng.uniform(20, 40)), seq) for sensor_id in range(1, args.sensors + 1)]
+            if args.binary:
+                mote.send_batch(readings)
+            else:
+                for reading in readings:
+                    mote.send(*reading)
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mote.close()
+
+
+if __name__ == "__main__":
+    main()
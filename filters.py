@@ -0,0 +1,115 @@
+import numpy as np
+
+from settings import PAST_VALUE_SMOOTHING_WINDOW, SMOOTHING_TRIM_FRACTION
+
+# smoothing of raw mote readings. every sensor owns a slot (row) in one shared
+# (slots, window) ring buffer; the filter kind is chosen per slot:
+#   mean     running mean over the window, O(1) per sample
+#   ema      exponential moving average with the same effective length, O(1)
+#   median   median of the window
+#   trimmed  mean of the window without the SMOOTHING_TRIM_FRACTION lowest / highest samples
+FILTER_KINDS = ("mean", "ema", "median", "trimmed")
+
+
+class RingBufferStore:
+    def __init__(self, window=PAST_VALUE_SMOOTHING_WINDOW, capacity=16, trim_fraction=SMOOTHING_TRIM_FRACTION):
+        self.window = window
+        self.alpha = 2.0 / (window + 1)
+        self.trim = int(window * trim_fraction)
+        self.size = 0
+        self.values = np.zeros((capacity, window))
+        self.head = np.zeros(capacity, dtype=int)
+        self.count = np.zeros(capacity, dtype=int)
+        self.sum = np.zeros(capacity)
+        self.ema = np.zeros(capacity)
+        self.filtered = np.zeros(capacity)
+        self.kinds = []
+
+    def add_slot(self, kind="mean"):
+        if kind not in FILTER_KINDS:
+            raise ValueError(f"unknown filter {kind!r}, expected one of {FILTER_KINDS}")
+        if self.size == len(self.head):
+            self._grow()
+        self.kinds.append(kind)
+        self.size += 1
+        return self.size - 1
+
+    def _grow(self):
+        capacity = 2 * len(self.head)
+        # new slots start empty, np.resize would fill them with copies of the old rows
+        for name in ("values", "head", "count", "sum", "ema", "filtered"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def reset(self, slot):
+        self.head[slot] = self.count[slot] = 0
+        self.sum[slot] = self.ema[slot] = self.filtered[slot] = 0.0
+
+    def push(self, slot, value):
+        h, c = self.head[slot], self.count[slot]
+        if c == self.window:
+            self.sum[slot] -= self.values[slot, h]
+        else:
+            c = self.count[slot] = c + 1
+        self.values[slot, h] = value
+        self.sum[slot] += value
+        self.ema[slot] = value if c == 1 else self.ema[slot] + self.alpha * (value - self.ema[slot])
+
+        h = self.head[slot] = (h + 1) % self.window
+        if h == 0:
+            # re-sum once per lap so the running sum cannot drift
+            self.sum[slot] = self.values[slot].sum()
+        return self._refresh(slot)
+
+    def push_many(self, slots, values):
+        # batch of readings from one tick; repeated slots are applied in arrival order
+        slots = np.asarray(slots, dtype=int)
+        values = np.asarray(values, dtype=float)
+        if len(slots) == 0:
+            return values
+
+        # split into rounds in which every slot appears at most once
+        order = np.argsort(slots, kind="stable")
+        sorted_slots = slots[order]
+        first = np.r_[0, np.flatnonzero(np.diff(sorted_slots)) + 1]
+        rank = np.empty(len(slots), dtype=int)
+        rank[order] = np.arange(len(slots)) - np.repeat(first, np.diff(np.r_[first, len(slots)]))
+
+        for r in range(rank.max() + 1):
+            pick = rank == r
+            s, v = slots[pick], values[pick]
+            h = self.head[s]
+            full = self.count[s] == self.window
+            self.sum[s] += v - np.where(full, self.values[s, h], 0.0)
+            self.values[s, h] = v
+            c = self.count[s] = np.minimum(self.count[s] + 1, self.window)
+            self.ema[s] = np.where(c == 1, v, self.ema[s] + self.alpha * (v - self.ema[s]))
+            h = self.head[s] = (h + 1) % self.window
+            wrapped = s[h == 0]
+            if len(wrapped):
+                self.sum[wrapped] = self.values[wrapped].sum(axis=1)
+
+        touched = np.unique(slots)
+        for slot in touched:
+            self._refresh(slot)
+        return self.filtered[slots]
+
+    def _refresh(self, slot):
+        kind, c = self.kinds[slot], self.count[slot]
+        if kind == "mean":
+            value = self.sum[slot] / c
+        elif kind == "ema":
+            value = self.ema[slot]
+        else:
+            # until the first lap completes the samples sit in [0, count)
+            window = self.values[slot, :c]
+            if kind == "median":
+                value = np.median(window)
+            else:
+                trim = min(self.trim, (c - 1) // 2)
+                value = np.sort(window)[trim:c - trim].mean()
+        self.filtered[slot] = value
+        return value
+
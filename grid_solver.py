@@ -0,0 +1,107 @@
+import threading
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import numpy as np
+
+from settings import WIDTH, HEIGHT, EPS, GRID_COARSE_STEP, GRID_REFINE_POINTS, GRID_MIN_STEP
+
+# the cost minimized here is the variance over sensors of  log R_i + 2 log d_i,
+# which has the same minimum as both models in estimator.py. expanding it,
+#   var(L + 2D) = var(L) + 4 var(D) + 4 cov(L, D)
+# so per layout only D, mean(D) and var(D) are needed and a solve is one matrix-vector product
+
+
+def layout_key(positions):
+    return tuple(np.round(np.asarray(positions, dtype=float)).astype(int).ravel())
+
+
+def coarse_grid(step=GRID_COARSE_STEP):
+    xs = np.arange(step / 2, WIDTH, step)
+    ys = np.arange(step / 2, HEIGHT, step)
+    gx, gy = np.meshgrid(xs, ys)
+    return np.column_stack((gx.ravel(), gy.ravel()))
+
+
+def log_distance_fields(positions, points):
+    positions = np.asarray(positions, dtype=float)
+    d = np.hypot(points[None, :, 0] - positions[:, None, 0], points[None, :, 1] - positions[:, None, 1])
+    return np.log(d + EPS)
+
+
+class DistanceFieldCache:
+    def __init__(self, step=GRID_COARSE_STEP, max_layouts=8):
+        self.step = step
+        self.max_layouts = max_layouts
+        self.points = coarse_grid(step)
+        self.hits = 0
+        self.misses = 0
+        self._fields = OrderedDict()
+        # the estimator thread reads while the ui thread invalidates on drags
+        self._lock = threading.Lock()
+
+    def get(self, positions):
+        key = layout_key(positions)
+        with self._lock:
+            entry = self._fields.get(key)
+            if entry is not None:
+                self._fields.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        fields = log_distance_fields(positions, self.points)
+        mean = fields.mean(axis=0)
+        entry = (fields, mean, fields.var(axis=0))
+        with self._lock:
+            self.misses += 1
+            self._fields[key] = entry
+            while len(self._fields) > self.max_layouts:
+                self._fields.popitem(last=False)
+        return entry
+
+    def invalidate(self):
+        with self._lock:
+            self._fields.clear()
+
+
+field_cache = DistanceFieldCache()
+
+
+def _grid_cost(logs, fields, mean, var):
+    n = len(logs)
+    return np.var(logs) + 4.0 * var + 4.0 * (logs @ fields / n - logs.mean() * mean)
+
+
+def objective_field(positions, readings, cache=field_cache):
+    # the cost at every cache.points in one pass, what the coarse search minimizes
+    logs = np.log(np.asarray(readings, dtype=float) + EPS)
+    return _grid_cost(logs, *cache.get(positions))
+
+
+def grid_solve(positions, readings, x0=None, cache=field_cache):
+    # x0 is accepted for a common estimator signature, the grid search does not need one
+    positions = np.asarray(positions, dtype=float)
+    logs = np.log(np.asarray(readings, dtype=float) + EPS)
+
+    fields, mean, var = cache.get(positions)
+    cost = _grid_cost(logs, fields, mean, var)
+    best = int(np.argmin(cost))
+    pt, best_cost = cache.points[best], cost[best]
+    evaluations = len(cost)
+
+    # coarse to fine: a small fixed grid around the best point, shrinking each level
+    step = cache.step
+    offsets = np.linspace(-1.0, 1.0, GRID_REFINE_POINTS)
+    ox, oy = np.meshgrid(offsets, offsets)
+    offsets = np.column_stack((ox.ravel(), oy.ravel()))
+    while step > GRID_MIN_STEP:
+        points = np.clip(pt + offsets * step, (0, 0), (WIDTH, HEIGHT))
+        local = log_distance_fields(positions, points)
+        local_cost = _grid_cost(logs, local, local.mean(axis=0), local.var(axis=0))
+        evaluations += len(local_cost)
+        i = int(np.argmin(local_cost))
+        pt, best_cost = points[i], local_cost[i]
+        step *= 2.0 / (GRID_REFINE_POINTS - 1)
+
+    # same fields as scipy's OptimizeResult, without importing scipy.optimize
+    return SimpleNamespace(x=np.array(pt), fun=best_cost, nfev=evaluations, success=True)
@@ -0,0 +1,256 @@
+import argparse
+import json
+import os
+import signal
+import socket
+import sys
+import time
+
+from settings import (SERIAL_PORT, SERIAL_PORTS, SERIAL_BAUDRATE, ESTIMATOR_MODE, MAX_SOURCES, SIMULATION_SEED,
+                      CAPTURE_REPLAY_SPEED, CALIBRATION, CALIBRATION_MIN_SENSORS)
+
+# the ingest -> smoothing -> estimation pipeline of display.py without a window, for the
+# gateway boxes. every estimate goes out as one json line on stdout, a udp socket
+# (udp://host:port) or a unix datagram socket (unix:///path). only numpy is imported up
+# front: pyserial, pandas and scipy load when the chosen source / estimator needs them
+
+
+class LineOutput:
+    def __init__(self, spec):
+        self.spec = spec
+        self.sent = 0
+        self.failed = 0
+        self.sock = None
+        if spec.startswith("udp://"):
+            host, port = spec[len("udp://"):].rsplit(":", 1)
+            self.address = (host, int(port))
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        elif spec.startswith("unix://"):
+            self.address = spec[len("unix://"):]
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        elif spec != "-":
+            raise ValueError(f"unknown output {spec!r}, expected -, udp://host:port or unix:///path")
+
+    def send(self, message):
+        line = json.dumps(message, separators=(",", ":"))
+        if self.sock is None:
+            sys.stdout.write(line + "\n")
+            sys.stdout.flush()
+        else:
+            try:
+                self.sock.sendto(line.encode() + b"\n", self.address)
+            except OSError:
+                # nobody listening right now, estimates are only worth anything while fresh
+                self.failed += 1
+                return
+        self.sent += 1
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+
+
+def load_layout(registry, path, now):
+    # sensor placement saved by display.py, motes without an id cannot be matched.
+    # returns the whole state for the calibration saved with it
+    with open(path) as f:
+        state = json.load(f)
+    for d in state.get("sensors", []):
+        if d.get("sensor_id") is not None:
+            centre = (d["x"] + d["width"] // 2, d["y"] + d["height"] // 2)
+            registry.add(centre, now, d["sensor_id"], active=False)
+    return state
+
+
+def make_solver(mode, use_tracker, max_sources):
+    # returns solve(positions, readings) -> list of (x, y), strongest source first, reset()
+    # for when the layout changes and the estimate cache underneath (keyed by the layout, so
+    # it never needs invalidating)
+    from estimate_cache import EstimateCache
+    from estimator import estimate, estimate_sources
+    if max_sources > 1:
+        from tracking import MultiSourceEstimator
+        cache = EstimateCache(estimate_sources)
+        solver = MultiSourceEstimator(max_sources, estimate=cache)
+        return solver.step, solver.reset, cache
+    cache = EstimateCache(estimate)
+    if use_tracker:
+        from tracking import SourceTracker
+        tracker = SourceTracker(mode=mode, estimate=cache)
+        return lambda positions, readings: [tracker.step(positions, readings)], tracker.reset, cache
+    return (lambda positions, readings: [tuple(map(int, cache(positions, readings, mode=mode).x[:2]))],
+            lambda: None, cache)
+
+
+# sources feed whatever is due into the registry and return the registry time they used
+
+class SerialSource:
+    def __init__(self, ports, baudrate):
+        from multi_sink import MultiSinkReader, detect_sink_ports
+        if ports == ["auto"]:
+            ports = detect_sink_ports()
+        self.reader = MultiSinkReader(ports, baudrate)
+        if not self.reader.readers:
+            raise SystemExit("no sink port could be opened")
+        self.reader.start()
+        self.done = False
+
+    def feed(self, registry, now):
+        readings = self.reader.drain()
+        registry.ingest([r.sensor_id for r in readings], [r.light for r in readings], now)
+        return now
+
+    def close(self):
+        print(self.reader.report(), file=sys.stderr)
+        self.reader.close()
+
+
+class SimulatorSource:
+    def __init__(self, path, seed):
+        from scheduler import SimulationScheduler
+        from synthetic import open_simulator
+        self.simulator = open_simulator(path, seed=seed)
+        self.scheduler = SimulationScheduler()
+        self.done = False
+
+    def feed(self, registry, now):
+        start, stop, now = self.scheduler.step(now)
+        if stop > start:
+            registry.ingest_rows(self.simulator.get_window(start, stop), now, self.simulator.centres)
+        return now
+
+    def close(self):
+        pass
+
+
+class ReplaySource:
+    def __init__(self, path, speed):
+        from capture import LogReplay
+        self.replay = LogReplay(path, speed)
+
+    @property
+    def done(self):
+        return self.replay.done
+
+    def feed(self, registry, now):
+        self.replay.feed(registry, now)
+        return now
+
+    def close(self):
+        pass
+
+
+def now_ms():
+    return time.monotonic() * 1000.0
+
+
+def _terminate(signum, frame):
+    # a service gets SIGTERM, shut down like on ctrl+c
+    raise KeyboardInterrupt
+
+
+def main():
+    parser = argparse.ArgumentParser(description="headless light source localisation, json lines out")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--port", action="append",
+                        help="sink mote serial port, repeat for several sinks or 'auto' (default source)")
+    source.add_argument("--simulate", metavar="XLSX", help="play a simulator workbook (or synthetic:<motes>) instead of a port")
+    source.add_argument("--replay", metavar="LSCAP", help="play a capture log instead of a port")
+    parser.add_argument("--baudrate", type=int, default=SERIAL_BAUDRATE)
+    parser.add_argument("--speed", type=float, default=CAPTURE_REPLAY_SPEED, help="replay speed, 0 for max")
+    parser.add_argument("--layout", help="state.json with the sensor placement (needs sensor ids)")
+    parser.add_argument("--mode", default=ESTIMATOR_MODE, help="pairwise, amplitude or grid")
+    parser.add_argument("--sources", type=int, default=MAX_SOURCES, help="most light sources to look for")
+    parser.add_argument("--no-tracker", action="store_true", help="solve every estimate from scratch")
+    parser.add_argument("--calibrate", action="store_true", default=CALIBRATION,
+                        help="refine the path-loss exponent and mote gains from the estimates "
+                             "(only with a --layout that matches the room)")
+    parser.add_argument("--rate", type=float, default=10.0, help="estimates per second")
+    parser.add_argument("--out", default="-", help="-, udp://host:port or unix:///path")
+    parser.add_argument("--count", type=int, default=None, help="stop after this many estimates")
+    args = parser.parse_args()
+    if args.calibrate and not args.layout:
+        # motes without a saved position sit at DEFAULT_CENTRE, the fit would learn that
+        parser.error("--calibrate needs --layout")
+
+    from calibration import PathLossCalibrator
+    from sensor_registry import SensorRegistry
+    registry = SensorRegistry()
+    calibrator = PathLossCalibrator()
+    if args.layout:
+        state = load_layout(registry, args.layout, now_ms())
+        calibrator.load(state.get("calibration"), registry.slot_of)
+
+    output = LineOutput(args.out)
+    if args.simulate:
+        feeder = SimulatorSource(args.simulate, SIMULATION_SEED)
+    elif args.replay:
+        feeder = ReplaySource(args.replay, args.speed or None)
+    else:
+        default = ["auto"] if SERIAL_PORTS == "auto" else SERIAL_PORTS or [SERIAL_PORT]
+        feeder = SerialSource(args.port or default, args.baudrate)
+    solve, reset, cache = make_solver(args.mode, not args.no_tracker, args.sources)
+    from grid_solver import layout_key
+
+    signal.signal(signal.SIGTERM, _terminate)
+    print(f"headless: pid {os.getpid()}, {args.mode} estimates to {args.out}", file=sys.stderr)
+
+    period = 1.0 / args.rate
+    next_tick = time.monotonic()
+    emitted = 0
+    layout = None
+    try:
+        while not feeder.done and (args.count is None or emitted < args.count):
+            now = feeder.feed(registry, now_ms())
+            registry.expire(now)
+
+            slots = registry.active_slots()
+            if len(slots) >= 2:
+                positions, readings = registry.snapshot()
+                # motes came, went silent or were moved by a replayed layout: warm starts and
+                # the tracker's motion belong to the old geometry
+                key = layout_key(positions)
+                if layout is not None and key != layout:
+                    reset()
+                layout = key
+                started = time.perf_counter()
+                # a calibration saved with the layout is applied even when not learning
+                sources = solve(positions, calibrator.correct(slots, readings))
+                if args.calibrate and len(sources) == 1 and len(slots) >= CALIBRATION_MIN_SENSORS:
+                    calibrator.update(slots, positions, readings, sources[0])
+                output.send({
+                    "t": time.time(),
+                    "x": sources[0][0],
+                    "y": sources[0][1],
+                    "sources": [list(s) for s in sources],
+                    "sensors": len(positions),
+                    "exponent": round(calibrator.exponent, 3),
+                    "solve_ms": round((time.perf_counter() - started) * 1000, 3),
+                })
+                emitted += 1
+
+            next_tick += period
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # fell behind, do not try to catch up with a burst
+                next_tick = time.monotonic()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        feeder.close()
+        output.close()
+        print(f"headless: {output.sent} estimates sent, {output.failed} failed, "
+              f"{cache.hits} cache hits, {cache.misses} misses", file=sys.stderr)
+        if args.calibrate:
+            # what was learned goes back next to the layout, like display.py saves it
+            state["calibration"] = calibrator.state(registry.ids)
+            with open(args.layout, "w") as f:
+                json.dump(state, f)
+            print(f"headless: calibration saved to {args.layout}, exponent {calibrator.exponent:.3f} "
+                  f"after {calibrator.updates} updates", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import heapq
+
+from serial_reader import SerialReader
+from settings import SERIAL_BAUDRATE, DEDUP_WINDOW, DEDUP_TIMEOUT
+
+# several sinks on several usb ports. each port has its own SerialReader thread, drain()
+# merges what they parsed by host timestamp and drops readings that already came in
+# through another sink, keyed on (senderID, seqNum) like the firmware's alreadySeen buffer
+
+SEQ_MODULO = 256
+# a duplicate too old to tell apart from a new reading (more than window behind the newest)
+STALE = -1
+
+
+def detect_sink_ports():
+    # usb serial adapters only, built-in uarts (/dev/ttyS*) never have a sink on them
+    from serial.tools import list_ports
+    return sorted(p.device for p in list_ports.comports() if p.vid is not None)
+
+
+class SeqWindow:
+    # the last `size` sequence numbers one mote delivered, and the port that delivered each
+    def __init__(self, size=DEDUP_WINDOW, timeout=DEDUP_TIMEOUT):
+        self.size = size
+        self.timeout = timeout
+        self.newest = None
+        self.last_time = None
+        self.seen = {}
+
+    def deliver(self, seq, port, timestamp):
+        # None for a new reading (now remembered), else the port that delivered it first or STALE
+        if self.newest is None or timestamp - self.last_time > self.timeout:
+            # first reading, or silent long enough that the mote may have rebooted
+            self.newest, self.seen = seq, {seq: port}
+            self.last_time = timestamp
+            return None
+
+        ahead = (seq - self.newest) % SEQ_MODULO
+        if ahead == 0 or ahead >= SEQ_MODULO // 2:
+            # not newer than the newest, late copy from a slower sink or a late original
+            if seq in self.seen:
+                return self.seen[seq]
+            if (self.newest - seq) % SEQ_MODULO >= self.size:
+                return STALE
+        else:
+            self.newest = seq
+            for old in [s for s in self.seen if (seq - s) % SEQ_MODULO >= self.size]:
+                del self.seen[old]
+        self.seen[seq] = port
+        self.last_time = timestamp
+        return None
+
+
+class PortStats:
+    def __init__(self, port):
+        self.port = port
+        self.received = 0
+        # readings another port delivered first, by that port
+        self.overlap = {}
+        self.first_time = None
+        self.last_time = None
+
+    @property
+    def overlapped(self):
+        return sum(self.overlap.values())
+
+    def throughput(self):
+        if self.first_time is None or self.last_time <= self.first_time:
+            return 0.0
+        return self.received / (self.last_time - self.first_time)
+
+
+class MultiSinkReader:
+    # same drain() / counters as SerialReader, over every port that could be opened
+    def __init__(self, ports, baudrate=SERIAL_BAUDRATE, window=DEDUP_WINDOW, timeout=DEDUP_TIMEOUT):
+        import serial
+        self.window = window
+        self.timeout = timeout
+        self.readers = []
+        for port in ports:
+            try:
+                self.readers.append(SerialReader(port, baudrate))
+            except serial.SerialException as e:
+                print(f"Error opening serial port {port}: {e}")
+        self.stats = [PortStats(reader.port) for reader in self.readers]
+        self.windows = {}
+        self.cross_duplicates = 0
+        self.stale = 0
+
+    @property
+    def ports(self):
+        return [reader.port for reader in self.readers]
+
+    @property
+    def frames(self):
+        return sum(reader.frames for reader in self.readers)
+
+    @property
+    def malformed(self):
+        return sum(reader.malformed for reader in self.readers)
+
+    @property
+    def dropped(self):
+        return sum(reader.dropped for reader in self.readers)
+
+    @property
+    def duplicates(self):
+        # repeats within one port plus copies that came in through several sinks
+        return sum(reader.duplicates for reader in self.readers) + self.cross_duplicates
+
+    def start(self):
+        for reader in self.readers:
+            reader.start()
+
+    def close(self):
+        for reader in self.readers:
+            reader.close()
+
+    def drain(self, limit=None):
+        batches = []
+        for i, reader in enumerate(self.readers):
+            batch = reader.drain(limit)
+            if batch:
+                stats = self.stats[i]
+                stats.received += len(batch)
+                if stats.first_time is None:
+                    stats.first_time = batch[0].timestamp
+                stats.last_time = batch[-1].timestamp
+            batches.append([(i, reading) for reading in batch])
+
+        readings = []
+        for port, reading in heapq.merge(*batches, key=lambda item: item[1].timestamp):
+            if reading.seq is None:
+                # a sink's own sample, only ever comes in through that sink
+                readings.append(reading)
+                continue
+            window = self.windows.get(reading.sensor_id)
+            if window is None:
+                window = self.windows[reading.sensor_id] = SeqWindow(self.window, self.timeout)
+            first = window.deliver(reading.seq, port, reading.timestamp)
+            if first is None:
+                readings.append(reading)
+            elif first == STALE:
+                self.stale += 1
+            else:
+                self.cross_duplicates += 1
+                overlap = self.stats[port].overlap
+                overlap[first] = overlap.get(first, 0) + 1
+        return readings
+
+    def report(self):
+        lines = [f"Serial: {self.frames} frames, {self.malformed} malformed, {self.duplicates} duplicate "
+                 f"({self.cross_duplicates} across sinks, {self.stale} stale), {self.dropped} dropped"]
+        for stats in self.stats:
+            share = stats.overlapped / stats.received * 100 if stats.received else 0.0
+            others = ", ".join(f"{self.stats[j].port}: {n}" for j, n in sorted(stats.overlap.items()))
+            lines.append(f"  {stats.port}: {stats.received} readings, {stats.throughput():.1f}/s, "
+                         f"{share:.0f}% already seen" + (f" ({others})" if others else ""))
+        return "\n".join(lines)
@@ -0,0 +1,97 @@
+import time
+
+import numpy as np
+import pygame as pg
+
+from estimator import position_covariance
+from grid_solver import field_cache, layout_key, objective_field
+from settings import (WIDTH, HEIGHT, EPS, OVERLAY_ALPHA, OVERLAY_READING_THRESHOLD, OVERLAY_MAX_REBUILDS_PER_S,
+                      OVERLAY_CONFIDENCE_CHI2)
+
+# debug mode overlay: how well every point on the map explains the readings, and how
+# tightly the sensors pin down the estimate
+
+LOW_COST_COLOR = np.array([255, 205, 0])
+HIGH_COST_COLOR = np.array([15, 105, 205])
+
+
+def heat_map(cost, shape, alpha=OVERLAY_ALPHA):
+    # (rows, cols) cost grid -> screen sized surface, low cost bright and opaque
+    level = np.log(cost + EPS)
+    span = level.max() - level.min()
+    t = ((level - level.min()) / span if span > 0 else np.zeros_like(level)).reshape(shape)
+
+    rgba = np.empty(shape + (4,), dtype=np.uint8)
+    rgba[..., :3] = LOW_COST_COLOR + t[..., None] * (HIGH_COST_COLOR - LOW_COST_COLOR)
+    rgba[..., 3] = alpha * (1.0 - t)
+    small = pg.image.frombuffer(rgba.tobytes(), (shape[1], shape[0]), 'RGBA')
+    # in display format, an unconverted full screen alpha blit costs ~10x more per frame
+    return pg.transform.smoothscale(small, (WIDTH, HEIGHT)).convert_alpha()
+
+
+def confidence_ellipse(pt, positions, readings, chi2=OVERLAY_CONFIDENCE_CHI2, points=48):
+    # outline of the confidence region around pt, None if it is not bounded
+    cov = position_covariance(pt, positions, readings)
+    if cov is None:
+        return None
+    vals, vecs = np.linalg.eigh(cov)
+    if vals.min() < 0:
+        return None
+    angles = np.linspace(0.0, 2.0 * np.pi, points, endpoint=False)
+    circle = np.column_stack((np.cos(angles), np.sin(angles))) * np.sqrt(chi2 * vals)
+    # a wildly unconstrained estimate still has to stay drawable
+    return np.clip(np.asarray(pt, dtype=float) + circle @ vecs.T, (-WIDTH, -HEIGHT), (2 * WIDTH, 2 * HEIGHT))
+
+
+class ObjectiveOverlay:
+    def __init__(self, cache=field_cache, threshold=OVERLAY_READING_THRESHOLD,
+                 max_rebuilds_per_s=OVERLAY_MAX_REBUILDS_PER_S):
+        self.cache = cache
+        self.threshold = threshold
+        self.min_interval = 1.0 / max_rebuilds_per_s
+        # grid is built row by row (see coarse_grid)
+        xs = np.unique(cache.points[:, 0])
+        self.shape = (len(cache.points) // len(xs), len(xs))
+        self.surface = None
+        self.ellipse = None
+        self._layout = None
+        self._logs = None
+        self._estimate = None
+        self._built_at = -np.inf
+        self.rebuilds = 0
+        self.reuses = 0
+
+    def update(self, positions, readings, estimate, now=None):
+        # returns True when the heat map was rebuilt (the whole screen changes). a stale map
+        # is kept until min_interval has passed since the last build, the ellipse is not
+        now = time.perf_counter() if now is None else now
+        if len(positions) < 2:
+            changed = self.surface is not None
+            self.surface = self.ellipse = self._layout = None
+            return changed
+
+        layout = layout_key(positions)
+        logs = np.log(np.asarray(readings, dtype=float) + EPS)
+        stale = (layout != self._layout or len(logs) != len(self._logs)
+                 or np.max(np.abs(logs - self._logs)) > self.threshold)
+        rebuild = stale and now - self._built_at >= self.min_interval
+        if rebuild:
+            self.surface = heat_map(objective_field(positions, readings, self.cache), self.shape)
+            self._layout, self._logs, self._built_at = layout, logs, now
+            self.rebuilds += 1
+        else:
+            self.reuses += 1
+
+        if rebuild or estimate != self._estimate:
+            self.ellipse = confidence_ellipse(estimate, positions, readings)
+            self._estimate = estimate
+        return rebuild
+
+    def draw_heat_map(self, screen):
+        if self.surface is not None:
+            screen.blit(self.surface, (0, 0))
+
+    def draw_ellipse(self, screen):
+        if self.ellipse is None:
+            return pg.Rect(0, 0, 0, 0)
+        return pg.draw.lines(screen, (255, 255, 255), True, self.ellipse.tolist(), 2)
@@ -0,0 +1,94 @@
+import json
+import threading
+import time
+from collections import deque
+
+from settings import PROFILE_WINDOW
+
+# per-frame stage timings of the main loop. call frame() at the top of every loop
+# iteration and lap(name) at the end of every stage: the time since the previous lap
+# (or the frame start) is booked to name. a trace records the same laps as complete
+# events in the chrome trace format (chrome://tracing, https://ui.perfetto.dev)
+
+
+class FrameProfiler:
+    def __init__(self, window=PROFILE_WINDOW):
+        self.window = window
+        # stage -> ms of the last `window` frames, in first seen order
+        self.stages = {}
+        self.frames = 0
+        self._frame = {}
+        self._frame_start = None
+        self._last = None
+
+        self.trace = None
+        self.trace_frames = 0
+        self.trace_path = None
+        self._trace_origin = None
+        self._threads = {}
+
+    def frame(self):
+        now = time.perf_counter()
+        if self._frame_start is not None:
+            self._end_frame(now)
+        self._frame_start = self._last = now
+        self._frame = {}
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self._frame[name] = self._frame.get(name, 0.0) + (now - self._last) * 1000.0
+        if self.trace is not None:
+            self._event(name, self._last, now)
+        self._last = now
+
+    def _end_frame(self, now):
+        self.frames += 1
+        self._frame["frame"] = (now - self._frame_start) * 1000.0
+        for name, ms in self._frame.items():
+            if name not in self.stages:
+                self.stages[name] = deque(maxlen=self.window)
+            self.stages[name].append(ms)
+
+        if self.trace is not None:
+            self._event("frame", self._frame_start, now, cat="frame")
+            self.trace_frames -= 1
+            if self.trace_frames <= 0:
+                self.stop_trace()
+
+    def averages(self):
+        # stage -> mean ms over the rolling window, stages skipped in a frame count as 0
+        count = len(self.stages.get("frame", ()))
+        return {name: sum(times) / count for name, times in self.stages.items() if count}
+
+    # -- TRACE --
+
+    def start_trace(self, frames, path):
+        self.trace = []
+        self.trace_frames = frames
+        self.trace_path = path
+        self._trace_origin = time.perf_counter()
+        self._threads = {}
+
+    def _event(self, name, start, end, cat="stage", thread=None):
+        thread = thread or threading.current_thread().name
+        if thread not in self._threads:
+            self._threads[thread] = len(self._threads) + 1
+            self.trace.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": self._threads[thread],
+                               "args": {"name": thread}})
+        self.trace.append({"name": name, "cat": cat, "ph": "X", "pid": 1, "tid": self._threads[thread],
+                           "ts": (start - self._trace_origin) * 1e6, "dur": (end - start) * 1e6})
+
+    def record(self, name, start, end, thread, **args):
+        # an event from another thread (the estimator), perf_counter start / end
+        if self.trace is not None and start >= self._trace_origin:
+            self._event(name, start, end, cat=thread, thread=thread)
+            if args:
+                self.trace[-1]["args"] = args
+
+    def stop_trace(self):
+        if self.trace is None:
+            return
+        with open(self.trace_path, "w") as f:
+            json.dump({"traceEvents": self.trace, "displayTimeUnit": "ms"}, f)
+        print(f"Trace of {len([e for e in self.trace if e.get('cat') == 'frame'])} frames written to {self.trace_path}")
+        self.trace = None
@@ -0,0 +1,73 @@
+from collections import OrderedDict
+
+import pygame as pg
+
+# per-process caches for things the draw calls used to rebuild every frame.
+# everything is created lazily, after pg.init()
+
+MAX_CACHED_SURFACES = 512
+
+_fonts = {}
+_surfaces = OrderedDict()
+_pulse_sheets = {}
+
+
+def font(size):
+    if size not in _fonts:
+        _fonts[size] = pg.font.Font(None, size)
+    return _fonts[size]
+
+
+def _cached(key, build):
+    surf = _surfaces.get(key)
+    if surf is None:
+        surf = _surfaces[key] = build()
+        if len(_surfaces) > MAX_CACHED_SURFACES:
+            _surfaces.popitem(last=False)
+    else:
+        _surfaces.move_to_end(key)
+    return surf
+
+
+def text(string, size, color):
+    # rendered label, keyed by text, size and colour
+    return _cached(("text", string, size, color), lambda: font(size).render(string, True, color))
+
+
+def filled(size, color):
+    # plain (optionally translucent) rectangle surface
+    def build():
+        surf = pg.Surface(size, pg.SRCALPHA)
+        surf.fill(color)
+        return surf
+    return _cached(("fill", size, color), build)
+
+
+class PulseSheet:
+    # every frame of a fading ring pulse, pre-rendered side by side on one surface
+    def __init__(self, color, min_radius, max_radius, max_alpha, width, frames):
+        self.frames = frames
+        self.cell = 2 * (min_radius + max_radius)
+        self.sheet = pg.Surface((self.cell * frames, self.cell), pg.SRCALPHA)
+        self.areas = []
+        centre = self.cell // 2
+        for i in range(frames):
+            t = i / frames
+            radius = int(min_radius + t * max_radius)
+            alpha = int(max_alpha * (1 - t))
+            cx = i * self.cell + centre
+            if alpha > 0:
+                pg.draw.circle(self.sheet, (*color, alpha), (cx, centre), radius, width)
+            self.areas.append((radius, pg.Rect(cx - radius, centre - radius, radius * 2, radius * 2)))
+
+    def blit(self, screen, pos, t):
+        # t in [0, 1) is the phase of the pulse
+        radius, area = self.areas[int(t * self.frames) % self.frames]
+        return screen.blit(self.sheet, (pos[0] - radius, pos[1] - radius), area)
+
+
+def pulse_sheet(color, min_radius, max_radius, max_alpha, width=4, frames=64):
+    key = (color, min_radius, max_radius, max_alpha, width, frames)
+    if key not in _pulse_sheets:
+        _pulse_sheets[key] = PulseSheet(color, min_radius, max_radius, max_alpha, width, frames)
+    return _pulse_sheets[key]
@@ -0,0 +1,148 @@
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from capture import LogReplay
+from estimator import estimate
+from sensor_registry import SensorRegistry
+from settings import ESTIMATOR_MODE
+from synthetic import open_simulator
+from tracking import SourceTracker
+
+# replays a dataset through the same registry ingest / smoothing / estimation code as
+# display.main, without opening a window. one dataset row is one frame, as in the app;
+# a capture log (.lscap) plays back in log time, one frame every 1000 / fps ms
+
+
+def make_solver(mode, use_tracker, fps):
+    if use_tracker:
+        tracker = SourceTracker(mode=mode)
+        return lambda positions, readings, tick: tracker.step(positions, readings, tick / fps)
+    return lambda positions, readings, tick: estimate(positions, readings, mode=mode).x[:2]
+
+
+def open_source(path, seed):
+    if path.endswith(".lscap"):
+        return LogReplay(path, speed=1.0)
+    return open_simulator(path, seed=seed)
+
+
+def frames(source, registry, ticks, fps):
+    # ingests one frame at a time, yields (tick, now, true position or None)
+    if isinstance(source, LogReplay):
+        tick = 0
+        while not source.done and (ticks is None or tick < ticks):
+            now = tick * 1000.0 / fps
+            source.feed(registry, now)
+            yield tick, now, None
+            tick += 1
+        return
+
+    truth = getattr(source, "get_truth", None)
+    for start, window in source.iter_chunks(stop=ticks):
+        true_positions = truth(start, start + len(window)) if truth else None
+        for offset, row in enumerate(window):
+            now = (start + offset) * 1000.0 / fps
+            registry.ingest_row(row, now, source.centres)
+            yield start + offset, now, None if true_positions is None else true_positions[offset]
+
+
+def replay(source, solve, ticks, fps, trace_allocs=False):
+    registry = SensorRegistry()
+    latencies, errors, alloc_blocks, alloc_peaks = [], [], [], []
+
+    for tick, now, true_position in frames(source, registry, ticks, fps):
+        registry.expire(now)
+        if len(registry.active_slots()) < 2:
+            continue
+        positions, readings = registry.snapshot()
+
+        if trace_allocs:
+            blocks = sys.getallocatedblocks()
+            tracemalloc.reset_peak()
+            traced = tracemalloc.get_traced_memory()[0]
+        t0 = time.perf_counter()
+        position = solve(positions, readings, tick)
+        latencies.append(time.perf_counter() - t0)
+        if trace_allocs:
+            alloc_peaks.append(tracemalloc.get_traced_memory()[1] - traced)
+            alloc_blocks.append(sys.getallocatedblocks() - blocks)
+
+        if true_position is not None:
+            errors.append(float(np.hypot(*(np.asarray(position, dtype=float) - true_position))))
+
+    return np.array(latencies), errors, alloc_blocks, alloc_peaks
+
+
+def summarize(latencies, errors, alloc_blocks, alloc_peaks, wall):
+    results = {
+        "solves": len(latencies),
+        "wall_s": wall,
+        "solves_per_s": len(latencies) / latencies.sum() if len(latencies) else 0.0,
+        "latency_ms": {f"p{q}": float(np.percentile(latencies, q) * 1e3) for q in (50, 95, 99)}
+                      if len(latencies) else {},
+    }
+    if alloc_peaks:
+        results["alloc"] = {
+            "traced_solves": len(alloc_peaks),
+            "peak_bytes_per_solve": float(np.mean(alloc_peaks)),
+            "net_blocks_per_solve": float(np.mean(alloc_blocks)),
+        }
+    if errors:
+        results["error_px"] = {"mean": float(np.mean(errors)),
+                               **{f"p{q}": float(np.percentile(errors, q)) for q in (50, 95)}}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="headless replay benchmark of the localisation pipeline")
+    parser.add_argument("--data", default="simulated_data.xlsx", help="workbook, synthetic:<motes> or capture log (.lscap)")
+    parser.add_argument("--ticks", type=int, default=None, help="frames to replay (default: whole dataset)")
+    parser.add_argument("--mode", default=ESTIMATOR_MODE, help="pairwise, amplitude or grid")
+    parser.add_argument("--tracker", action="store_true", help="solve through the kalman tracker like the app")
+    parser.add_argument("--fps", type=float, default=60.0, help="frame rate the replay pretends to run at")
+    parser.add_argument("--alloc-ticks", type=int, default=200,
+                        help="replay the first N ticks again with allocation tracing (0 to skip)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the results as json to this file")
+    args = parser.parse_args()
+
+    source = open_source(args.data, args.seed)
+    start = time.perf_counter()
+    latencies, errors, _, _ = replay(source, make_solver(args.mode, args.tracker, args.fps), args.ticks, args.fps)
+    wall = time.perf_counter() - start
+
+    # separate pass so tracing overhead does not leak into the latencies
+    alloc_blocks, alloc_peaks = [], []
+    if args.alloc_ticks:
+        tracemalloc.start()
+        source = open_source(args.data, args.seed)
+        _, _, alloc_blocks, alloc_peaks = replay(source, make_solver(args.mode, args.tracker, args.fps),
+                                                 args.alloc_ticks, args.fps, trace_allocs=True)
+        tracemalloc.stop()
+
+    results = summarize(latencies, errors, alloc_blocks, alloc_peaks, wall)
+    results["config"] = {"data": args.data, "ticks": args.ticks, "mode": args.mode, "tracker": args.tracker,
+                         "seed": args.seed, "python": platform.python_version(), "numpy": np.__version__}
+
+    print(f"{results['solves']} solves, {results['solves_per_s']:.0f} solves/s")
+    for name, value in results["latency_ms"].items():
+        print(f"  latency {name}: {value:.3f} ms")
+    if "alloc" in results:
+        print(f"  allocations: {results['alloc']['peak_bytes_per_solve']:.0f} B peak, "
+              f"{results['alloc']['net_blocks_per_solve']:.1f} net blocks per solve")
+    if "error_px" in results:
+        print(f"  error: {results['error_px']['mean']:.1f} px mean, {results['error_px']['p95']:.1f} px p95")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
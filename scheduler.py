@@ -0,0 +1,58 @@
+from settings import SIMULATION_CLOCK, SIMULATION_MAX_BATCH, SIMULATION_RENDER_FPS, SIMULATION_SAMPLE_RATE
+
+# decides which simulator samples are due, independent of how fast frames get drawn
+#   wall     samples follow the wall clock at rate per second, a slow frame just gets a bigger batch
+#   virtual  every frame advances the simulation by exactly frame_ms, however long it took
+#   max      as fast as the pipeline keeps up, max_batch samples per step and only one
+#            frame every 1 / render_fps seconds of wall time is drawn
+CLOCK_MODES = ("wall", "virtual", "max")
+
+
+class SimulationScheduler:
+    def __init__(self, rate=SIMULATION_SAMPLE_RATE, clock=SIMULATION_CLOCK, frame_ms=1000 / 60,
+                 max_batch=SIMULATION_MAX_BATCH, render_fps=SIMULATION_RENDER_FPS):
+        if clock not in CLOCK_MODES:
+            raise ValueError(f"unknown simulation clock {clock!r}, expected one of {CLOCK_MODES}")
+        self.clock = clock
+        self.sample_ms = 1000.0 / rate
+        self.frame_ms = frame_ms
+        self.max_batch = max_batch
+        self.render_ms = 1000.0 / render_fps
+        # first sample not handed out yet, and the wall time of the first step
+        self.next_sample = 0
+        self.origin = None
+        self.virtual_ms = 0.0
+        self.last_render = None
+        self.rendered = 0
+        self.skipped = 0
+
+    @property
+    def max_speed(self):
+        return self.clock == "max"
+
+    def step(self, wall_ms):
+        # (start, stop, now): samples [start, stop) are due and now is the simulation time in ms,
+        # on the same scale as wall_ms so registry timeouts keep working
+        if self.origin is None:
+            self.origin = wall_ms
+        if self.clock == "wall":
+            elapsed = wall_ms - self.origin
+        elif self.clock == "virtual":
+            elapsed = self.virtual_ms
+            self.virtual_ms += self.frame_ms
+        else:
+            elapsed = (self.next_sample + self.max_batch - 1) * self.sample_ms
+
+        start = self.next_sample
+        self.next_sample = max(int(elapsed / self.sample_ms) + 1, start)
+        return start, self.next_sample, self.origin + elapsed
+
+    def should_render(self, wall_ms):
+        if not self.max_speed:
+            return True
+        if self.last_render is not None and wall_ms - self.last_render < self.render_ms:
+            self.skipped += 1
+            return False
+        self.last_render = wall_ms
+        self.rendered += 1
+        return True
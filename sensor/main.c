@@ -9,6 +9,7 @@
 
 #include "stdmansos.h"
 #include <radio.h>
+#include <serial.h>
 #include <serial_number.h>
 #include <string.h>
 
@@ -25,6 +26,17 @@
 #define BEACON_INTERVAL_MS 2000
 #define LOCAL_SAMPLE_MS 500
 
+/* 1 = sink sends batched binary frames to the host, 0 = one text line per reading.
+ * frame: A5 5A | count | count * Record | checksum (low byte of sum of count + records) */
+#define BINARY_OUTPUT 0
+#define BINARY_SYNC0 0xA5
+#define BINARY_SYNC1 0x5A
+#define BINARY_BATCH 8
+#define BINARY_FLUSH_MS 100
+/* records queued between two main loop passes, at most MAX_RECORDS (32) on the host */
+#define BINARY_QUEUE 32
+#define RECORD_NO_SEQ 0x01
+
 typedef struct {
   uint8_t type;
   uint16_t senderID;
@@ -35,6 +47,13 @@ typedef struct {
   uint8_t checksum;
 } __attribute__((packed)) Packet;
 
+typedef struct {
+  uint16_t senderID;
+  uint16_t light;
+  uint8_t seqNum;
+  uint8_t flags;
+} __attribute__((packed)) Record;
+
 /* -- global variables -- */
 static uint16_t myID;
 static uint8_t seqNum = 0;
@@ -51,6 +70,14 @@ typedef struct {
 static Seen seenBuf[MAX_SEEN];
 static uint8_t seenIdx = 0;
 
+#if BINARY_OUTPUT
+/* filled by onReceive (interrupt) and the main loop, only ever sent by the main loop */
+static Record outBuf[BINARY_QUEUE];
+static volatile uint8_t outCount = 0;
+static uint16_t outDropped = 0;
+static uint32_t lastFlush = 0;
+#endif
+
 static uint16_t readChipID(void) {
   uint16_t sn[4];
   serialNumberRead((uint8_t *)sn);
@@ -73,6 +100,61 @@ static bool alreadySeen(uint16_t id, uint8_t seq) {
   return false;
 }
 
+#if BINARY_OUTPUT
+/* main loop only: take the queued records with interrupts off, send them with interrupts on */
+static void flushRecords(void) {
+  static Record frame[BINARY_QUEUE];
+  uint8_t count, sum;
+  uint16_t i, len;
+  const uint8_t *bytes = (const uint8_t *)frame;
+  Handle_t h;
+
+  lastFlush = getJiffies();
+  ATOMIC_START(h);
+  count = outCount;
+  memcpy(frame, outBuf, count * sizeof(Record));
+  outCount = 0;
+  ATOMIC_END(h);
+  if (count == 0)
+    return;
+
+  sum = count;
+  len = count * sizeof(Record);
+  serialSendByte(PRINTF_SERIAL_ID, BINARY_SYNC0);
+  serialSendByte(PRINTF_SERIAL_ID, BINARY_SYNC1);
+  serialSendByte(PRINTF_SERIAL_ID, count);
+  for (i = 0; i < len; i++) {
+    serialSendByte(PRINTF_SERIAL_ID, bytes[i]);
+    sum += bytes[i];
+  }
+  serialSendByte(PRINTF_SERIAL_ID, sum);
+}
+#endif /* BINARY_OUTPUT */
+
+/* hand one reading to the host, hasSeq = 0 for the sink's own samples.
+ * called from onReceive too: in binary mode it only queues, the main loop sends */
+static void reportReading(uint16_t id, uint16_t light, uint8_t seq, bool hasSeq) {
+#if BINARY_OUTPUT
+  Handle_t h;
+  ATOMIC_START(h);
+  if (outCount < BINARY_QUEUE) {
+    outBuf[outCount].senderID = id;
+    outBuf[outCount].light = light;
+    outBuf[outCount].seqNum = seq;
+    outBuf[outCount].flags = hasSeq ? 0 : RECORD_NO_SEQ;
+    outCount++;
+  } else {
+    outDropped++;  /* host sees the gap in seqNum */
+  }
+  ATOMIC_END(h);
+#else
+  if (hasSeq)
+    PRINTF("<START>DEBUG_INFO=SENSOR_DATA, ID=%u, Light=%u, Seq=%u<END>\n", id, light, seq);
+  else
+    PRINTF("<START>DEBUG_INFO=SINK_DATA, ID=%u, Light=%u<END>\n", id, light);
+#endif
+}
+
 static void sendBeacon(void) {
   Packet pkt = {
       .type = BEACON_PACKET,
@@ -118,7 +200,11 @@ static void onReceive(void) {
       hopCount = pkt.hopCount + 1;
       nextHopID = pkt.senderID;
       lastBeaconMs = getJiffies();
+#if !BINARY_OUTPUT
+      /* in binary mode the port carries frames sent from the main loop, text from this
+       * interrupt could land inside one */
       PRINTF("Route via %u (hops=%u)\n", nextHopID, hopCount);
+#endif
     }
     if (!IS_SINK) {
       pkt.hopCount = hopCount;
@@ -133,8 +219,7 @@ static void onReceive(void) {
     //   PRINTF("DATA in: from %u Seq=%u Light=%u\n", pkt.senderID, pkt.seqNum,
     //          pkt.light);
         if (!alreadySeen(pkt.senderID, pkt.seqNum)) {
-            PRINTF("<START>DEBUG_INFO=SENSOR_DATA, ID=%u, Light=%u, Seq=%u<END>\n",
-                   pkt.senderID, pkt.light, pkt.seqNum);
+            reportReading(pkt.senderID, pkt.light, pkt.seqNum, true);
             redLedToggle();
         }
         return; // sink does not forward DATA
@@ -143,8 +228,10 @@ static void onReceive(void) {
       pkt.hopCount = hopCount;
       pkt.nextDestID = nextHopID;
       radioSend(&pkt, sizeof(pkt));
+#if !BINARY_OUTPUT
       PRINTF("Forwarded DATA from %u Seq=%u -> %u\n", pkt.senderID, pkt.seqNum,
              nextHopID);
+#endif
       greenLedToggle();
     }
   }
@@ -175,10 +262,16 @@ void appMain(void) {
       }
 
       if ((uint32_t)(getJiffies() - lastLocalSample) >= LOCAL_SAMPLE_MS) {
-        PRINTF("<START>DEBUG_INFO=SINK_DATA, ID=%u, Light=%u<END>\n", myID, lightRead());
+        reportReading(myID, lightRead(), 0, false);
         redLedToggle();
         lastLocalSample = now;
       }
+
+#if BINARY_OUTPUT
+      /* a full batch goes out right away, a half-full one does not sit around when traffic is low */
+      if (outCount >= BINARY_BATCH || (uint32_t)(getJiffies() - lastFlush) >= BINARY_FLUSH_MS)
+        flushRecords();
+#endif
     }
     // tiny sleep for CPU to breathe
     mdelay(50);
@@ -0,0 +1,128 @@
+import heapq
+
+import numpy as np
+
+from filters import RingBufferStore
+from settings import (SENSOR_INACTIVE_TIMEOUT, SENSOR_SIZE, SIMULATION_POSITIONS, SMOOTHING_FILTER,
+                      PAST_VALUE_SMOOTHING_WINDOW)
+
+# new motes show up here until someone drags them (sensor centre)
+DEFAULT_CENTRE = (150 + SENSOR_SIZE // 2, 150 + SENSOR_SIZE // 2)
+# centres of the simulated motes, by index in the dataset
+SIMULATION_CENTRES = np.array(SIMULATION_POSITIONS, dtype=float) + SENSOR_SIZE // 2
+
+
+class SensorRegistry:
+    # structure-of-arrays sensor state indexed by slot, plus a mote id -> slot map.
+    # the estimator and the renderer read positions / values / active directly
+    def __init__(self, capacity=16, timeout_ms=SENSOR_INACTIVE_TIMEOUT, window=PAST_VALUE_SMOOTHING_WINDOW):
+        self.timeout_ms = timeout_ms
+        # latest time the registry was given, for callers without a clock of their own
+        self.now = 0.0
+        self.size = 0
+        self.ids = []
+        self.index = {}
+        self.positions = np.zeros((capacity, 2))
+        self.values = np.zeros(capacity)
+        self.last_seen = np.zeros(capacity)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.store = RingBufferStore(window=window, capacity=capacity)
+        # inactivity timers: (deadline, slot), at most one armed entry per slot
+        self._timers = []
+        self._armed = np.zeros(capacity, dtype=bool)
+
+    def __len__(self):
+        return self.size
+
+    def add(self, centre, now, sensor_id=None, active=True, value=10.0, filter_kind=SMOOTHING_FILTER):
+        if self.size == len(self.active):
+            self._grow()
+        slot = self.size
+        self.size += 1
+        self.ids.append(sensor_id)
+        if sensor_id is not None:
+            self.index[sensor_id] = slot
+        self.positions[slot] = centre
+        self.values[slot] = value
+        self.last_seen[slot] = now
+        self.store.add_slot(filter_kind)
+        self.set_active(slot, active)
+        return slot
+
+    def _grow(self):
+        capacity = 2 * len(self.active)
+        for name in ("positions", "values", "last_seen", "active", "_armed"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def slot_of(self, sensor_id):
+        return self.index.get(sensor_id)
+
+    def ingest(self, sensor_ids, lights, now, centres=None):
+        # one tick of readings; unknown motes get a slot at their centre (or DEFAULT_CENTRE).
+        # returns the slots that were created
+        slots, created = [], []
+        for i, sensor_id in enumerate(sensor_ids):
+            slot = self.index.get(sensor_id)
+            if slot is None:
+                slot = self.add(DEFAULT_CENTRE if centres is None else centres[i], now, sensor_id)
+                created.append(slot)
+            slots.append(slot)
+        self.update(slots, lights, now)
+        return created
+
+    def ingest_row(self, row, now, centres=SIMULATION_CENTRES):
+        # one simulator row, NaN where a mote has no sample; centres by column
+        row = np.asarray(row, dtype=float)
+        present = np.flatnonzero(~np.isnan(row))
+        return self.ingest(present.tolist(), row[present], now, centres[present])
+
+    def ingest_rows(self, window, now, centres=SIMULATION_CENTRES):
+        # several simulator rows in one batch, applied in row order
+        window = np.asarray(window, dtype=float)
+        rows, cols = np.nonzero(~np.isnan(window))
+        return self.ingest(cols.tolist(), window[rows, cols], now, centres[cols])
+
+    def update(self, slots, lights, now):
+        if not len(slots):
+            return
+        slots = np.asarray(slots, dtype=int)
+        self.values[slots] = self.store.push_many(slots, lights)
+        self.last_seen[slots] = now
+        self.now = max(self.now, now)
+        for slot in np.unique(slots):
+            self.set_active(slot, True)
+
+    def set_active(self, slot, active):
+        self.active[slot] = active
+        if active and not self._armed[slot]:
+            self._armed[slot] = True
+            heapq.heappush(self._timers, (self.last_seen[slot] + self.timeout_ms, slot))
+
+    def expire(self, now):
+        # deactivate sensors that have been silent for timeout_ms; O(log N) per expired timer
+        self.now = max(self.now, now)
+        while self._timers and self._timers[0][0] < now:
+            _, slot = heapq.heappop(self._timers)
+            deadline = self.last_seen[slot] + self.timeout_ms
+            if deadline < now:
+                self.active[slot] = False
+                self._armed[slot] = False
+                # whatever the slot hears next starts a fresh window, not the old mote's history
+                self.store.reset(slot)
+            else:
+                # seen again since the timer was armed, check back at the new deadline
+                heapq.heappush(self._timers, (deadline, slot))
+
+    def move(self, slot, centre):
+        self.positions[slot] = centre
+
+    def active_slots(self):
+        return np.flatnonzero(self.active[:self.size])
+
+    def snapshot(self):
+        # positions and smoothed readings of the active sensors, copies safe to hand to another thread
+        slots = self.active_slots()
+        return self.positions[slots], self.values[slots]
@@ -0,0 +1,191 @@
+import queue
+import re
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+START = b'<START>'
+END = b'<END>'
+# e.g. b"DEBUG_INFO=SENSOR_DATA, ID=17, Light=645, Seq=3" between START and END
+FRAME_RE = re.compile(rb'DEBUG_INFO=([^,]+),\s*ID=(\d+),\s*Light=(\d+)(?:,\s*Seq=(\d+))?')
+
+# seq is None for the sink's own SINK_DATA frames, timestamp is host time.time()
+Reading = namedtuple('Reading', ['sensor_id', 'light', 'seq', 'timestamp'])
+
+
+# binary frames from sinks built with BINARY_OUTPUT (sensor/main.c):
+#   A5 5A | count | count * record | checksum
+# record is the packed little-endian {u16 senderID, u16 light, u8 seqNum, u8 flags},
+# checksum is the low byte of the sum of count and the record bytes
+SYNC = b'\xa5\x5a'
+RECORD_DTYPE = np.dtype([('id', '<u2'), ('light', '<u2'), ('seq', 'u1'), ('flags', 'u1')])
+RECORD_NO_SEQ = 0x01
+MAX_RECORDS = 32
+
+
+def frame_checksum(data):
+    return sum(data) & 0xFF
+
+
+class FrameParser:
+    # incremental parser over a bytearray, feed() returns the readings completed by new data.
+    # the stream format is detected from the first valid frame, so old text-only firmware keeps working
+    def __init__(self, mode=None):
+        self.buffer = bytearray()
+        self.mode = mode
+        self.malformed = 0
+
+    def feed(self, data, timestamp):
+        buf = self.buffer
+        buf += data
+        readings = []
+
+        if self.mode is None:
+            text, binary = buf.find(START), buf.find(SYNC)
+            if binary >= 0 and (text < 0 or binary < text):
+                pos = self._parse_binary(buf, binary, timestamp, readings)
+                if readings:
+                    self.mode = 'binary'
+            else:
+                pos = self._parse_text(buf, 0, timestamp, readings)
+                if readings:
+                    self.mode = 'text'
+        elif self.mode == 'binary':
+            pos = self._parse_binary(buf, 0, timestamp, readings)
+        else:
+            pos = self._parse_text(buf, 0, timestamp, readings)
+
+        # compact once per feed instead of once per frame
+        del buf[:pos]
+        return readings
+
+    def _parse_text(self, buf, pos, timestamp, readings):
+        while True:
+            start = buf.find(START, pos)
+            if start < 0:
+                # keep a tail that could be the beginning of a split START marker
+                return max(pos, len(buf) - len(START) + 1)
+            end = buf.find(END, start + len(START))
+            if end < 0:
+                return start
+
+            body_start = start + len(START)
+            # a second START before END means the first frame was cut off
+            restart = buf.find(START, body_start, end)
+            if restart >= 0:
+                self.malformed += 1
+                pos = restart
+                continue
+
+            pos = end + len(END)
+            match = FRAME_RE.fullmatch(buf, body_start, end)
+            if match is None:
+                self.malformed += 1
+                continue
+            seq = match.group(4)
+            readings.append(Reading(int(match.group(2)), int(match.group(3)),
+                                    int(seq) if seq is not None else None, timestamp))
+
+    def _parse_binary(self, buf, pos, timestamp, readings):
+        while True:
+            start = buf.find(SYNC, pos)
+            if start < 0:
+                return max(pos, len(buf) - len(SYNC) + 1)
+            if len(buf) < start + 3:
+                return start
+            count = buf[start + 2]
+            if count == 0 or count > MAX_RECORDS:
+                self.malformed += 1
+                pos = start + 1
+                continue
+            end = start + 3 + count * RECORD_DTYPE.itemsize
+            if len(buf) < end + 1:
+                return start
+
+            with memoryview(buf) as view:
+                valid = frame_checksum(view[start + 2:end]) == buf[end]
+            if not valid:
+                # could be a sync pattern inside a record, resync one byte later
+                self.malformed += 1
+                pos = start + 1
+                continue
+
+            # decode in place; tolist() copies out so the bytearray can be compacted afterwards
+            records = np.frombuffer(buf, dtype=RECORD_DTYPE, count=count, offset=start + 3).tolist()
+            for sensor_id, light, seq, flags in records:
+                readings.append(Reading(sensor_id, light, None if flags & RECORD_NO_SEQ else seq, timestamp))
+            pos = end + 1
+
+
+class SerialReader:
+    # owns the serial port on its own thread and hands parsed readings to the ui through a bounded queue
+    def __init__(self, port, baudrate=38400, maxsize=4096, timeout=0.05):
+        # pyserial is only needed once a port is opened (fake_mote, the parser and captures do without)
+        import serial
+        self.port = port
+        self.ser = serial.Serial(port, baudrate, timeout=timeout)
+        self.parser = FrameParser()
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.frames = 0
+        self.duplicates = 0
+        self.dropped = 0
+        self.last_seq = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def malformed(self):
+        return self.parser.malformed
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"serial {self.port}", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.ser.close()
+
+    def drain(self, limit=None):
+        readings = []
+        while limit is None or len(readings) < limit:
+            try:
+                readings.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return readings
+
+    def _push(self, reading):
+        try:
+            self.queue.put_nowait(reading)
+        except queue.Full:
+            # the ui fell behind, the oldest reading is the least useful one
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            self.dropped += 1
+            self.queue.put_nowait(reading)
+
+    def _run(self):
+        import serial
+        while not self._stop.is_set():
+            try:
+                data = self.ser.read(self.ser.in_waiting or 1)
+            except serial.SerialException as e:
+                print(f"Serial port {self.port} failed: {e}")
+                return
+            if not data:
+                continue
+
+            for reading in self.parser.feed(data, time.time()):
+                self.frames += 1
+                if reading.seq is not None:
+                    if self.last_seq.get(reading.sensor_id) == reading.seq:
+                        self.duplicates += 1
+                        continue
+                    self.last_seq[reading.sensor_id] = reading.seq
+                self._push(reading)
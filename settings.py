@@ -5,15 +5,145 @@ map_bg_color = (12, 12, 14)
 map_sensor_inactive_color = (235, 64, 52)
 map_sensor_active_color = (0, 255, 0)  # Green color for the active sensor
 
+SENSOR_SIZE = 20
+# top-left corners of the simulated motes, by index in the dataset
+SIMULATION_POSITIONS = [
+    [280, 180],
+    [WIDTH - 180, 180],
+    [WIDTH - 280, HEIGHT - 180],
+    [280, HEIGHT - 180],
+    [WIDTH // 2, HEIGHT // 2],
+]
+
 MAX_SENSOR_STRENGTH = 40
 MIN_SENSOR_STRENGTH = 1e-6
 
+# push only the changed screen regions each frame instead of flipping the whole
+# window, helps on low-power laptops
+DIRTY_RECT_MODE = False
+
+# pencil layer: keep a raster copy every N strokes so undo replays at most N - 1 strokes,
+# only the newest few copies are kept (each is a full screen surface)
+STROKE_CHECKPOINT_INTERVAL = 16
+STROKE_MAX_CHECKPOINTS = 8
+
 # enable to clear sensors each run
 SENSOR_MODE = False
 SIMULATION_MODE = True
+# what SIMULATION_MODE plays: a workbook, or "synthetic:<motes>" for generated load (see synthetic.py)
+SIMULATION_DATA = 'simulated_data.xlsx'
+# seed for the simulator's filler noise, None for a fresh one every run
+SIMULATION_SEED = None
+# simulator samples per second, and the clock they follow: "wall", "virtual" (fixed step
+# per frame) or "max" (as fast as possible, drawing only SIMULATION_RENDER_FPS frames a second).
+# see scheduler.py
+SIMULATION_SAMPLE_RATE = 60
+SIMULATION_CLOCK = "wall"
+SIMULATION_MAX_BATCH = 64
+SIMULATION_RENDER_FPS = 20
+# generated load: mote layout ("grid", "ring", "random"), light sources and how they move
+# ("static", "orbit", "wander", speed in px/s), brightness (reading at 1 px), log-normal
+# reading noise and the chance that a reading goes missing
+SYNTHETIC_LAYOUT = "grid"
+SYNTHETIC_SOURCES = 1
+SYNTHETIC_TRAJECTORY = "orbit"
+SYNTHETIC_SPEED = 120.0
+SYNTHETIC_BRIGHTNESS = 1e7
+SYNTHETIC_NOISE = 0.05
+SYNTHETIC_DROPOUT = 0.05
+# the room it pretends to be: path-loss exponent and spread of the motes' log gains
+SYNTHETIC_EXPONENT = 2.0
+SYNTHETIC_GAIN_SPREAD = 0.0
+
+# profiling: F3 toggles a HUD with the stage timings of the last PROFILE_WINDOW frames,
+# F4 records the next PROFILE_TRACE_FRAMES frames into a chrome trace (time.strftime pattern)
+PROFILE_HUD = False
+PROFILE_WINDOW = 120
+PROFILE_TRACE_FRAMES = 300
+PROFILE_TRACE_PATH = 'trace-%Y%m%d-%H%M%S.json'
+
+# sink mote connection
+SERIAL_PORT = '/dev/ttyUSB0'
+SERIAL_BAUDRATE = 38400
+# several sinks: None reads SERIAL_PORT only, "auto" every usb serial port found, or a list of ports
+SERIAL_PORTS = None
+# host side duplicate filter across sinks: sequence numbers remembered per mote (8 bit, wraps
+# around) and seconds of silence after which a mote's window starts over (it may have rebooted)
+DEDUP_WINDOW = 32
+DEDUP_TIMEOUT = 10.0
+
+# record live serial traffic and layout changes to this file (time.strftime pattern,
+# e.g. 'capture-%Y%m%d-%H%M%S.lscap'), None to disable. see capture.py
+CAPTURE_PATH = None
+# in SIMULATION_MODE, play this capture back instead of simulated_data.xlsx
+CAPTURE_REPLAY_PATH = None
+# playback rate of the capture, None for as fast as possible
+CAPTURE_REPLAY_SPEED = 1.0
+# blocks between index blocks in a capture
+CAPTURE_INDEX_EVERY = 64
 
 # constants
 
 EPS = 1e-6
 SENSOR_INACTIVE_TIMEOUT = 10 * 90
-PAST_VALUE_SMOOTHING_WINDOW = 90
\ No newline at end of file
+PAST_VALUE_SMOOTHING_WINDOW = 90
+# per sensor smoothing filter: "mean", "ema", "median" or "trimmed" (see filters.py)
+SMOOTHING_FILTER = "mean"
+SMOOTHING_TRIM_FRACTION = 0.1
+
+# "pairwise" compares every sensor pair (O(N^2)), "amplitude" fits the source
+# strength as an extra unknown (O(N)) and scales to many more motes, "grid"
+# searches the whole map with cached distance fields (no local minima)
+ESTIMATOR_MODE = "pairwise"
+
+# "grid" mode: coarse cell size in pixels, then a refine_points^2 local grid
+# per level until the spacing drops under min_step
+GRID_COARSE_STEP = 10
+GRID_REFINE_POINTS = 9
+GRID_MIN_STEP = 0.5
+
+# debug overlay: heat map of the estimator objective on the GRID_COARSE_STEP grid and a
+# confidence ellipse around the estimate (see overlay.py)
+OVERLAY_ALPHA = 140
+# the heat map is only rebuilt once a smoothed reading moved this far (log units) or the layout changed
+OVERLAY_READING_THRESHOLD = 0.05
+# and at most this often: a build costs 5-10 ms on the render thread, with a moving source
+# the readings cross the threshold nearly every frame
+OVERLAY_MAX_REBUILDS_PER_S = 4
+# chi-square quantile for 2 dof of the ellipse, 5.991 is 95 %
+OVERLAY_CONFIDENCE_CHI2 = 5.991
+
+# constant-velocity kalman tracking of the source (pixels, seconds)
+TRACKER_ACCEL_NOISE = 400.0
+TRACKER_MEASUREMENT_NOISE = 15.0
+# skip the solve while the predicted position fits the readings this close (log units)
+TRACKER_FIT_TOLERANCE = 0.02
+
+# most light sources the "multi" estimator looks for (lamps, windows). every source costs
+# three unknowns, so K sources need at least 3K + 1 active sensors; 1 keeps the tracker
+MAX_SOURCES = 1
+# an extra source has to lower the BIC by this much to be believed (6 is "strong evidence")
+SOURCE_SELECTION_MARGIN = 6.0
+# evaluation budget of each K's fit per solve
+MULTI_SOURCE_MAX_NFEV = 100
+
+# path-loss exponent the light model starts from (2 is the inverse-square law), refined
+# online together with a gain offset per mote when CALIBRATION is on (see calibration.py).
+# it learns from the estimates, so only turn it on with the motes placed where they really
+# are: a wrong layout is fitted into the exponent and gains and saved to state.json.
+# a calibration already in state.json is used either way
+PATH_LOSS_EXPONENT = 2.0
+CALIBRATION = False
+# rls: weight of the starting values in readings' worth, how much of the past every update
+# keeps (0.999 forgets over ~1000 updates), and the exponents believed at all
+CALIBRATION_PRIOR = 50.0
+CALIBRATION_FORGETTING = 0.999
+CALIBRATION_EXPONENT_RANGE = (1.0, 4.0)
+# the calibration learns from the estimates, it needs spare sensors to tell a gain from a
+# position error
+CALIBRATION_MIN_SENSORS = 6
+
+# lru cache of estimates in front of the solver (see estimate_cache.py): entries kept, and
+# the log reading step under which two snapshots count as the same (0.01 is ~1 %)
+ESTIMATE_CACHE_SIZE = 256
+ESTIMATE_CACHE_TOLERANCE = 0.01
@@ -0,0 +1,86 @@
+import os
+
+import numpy as np
+import pygame as pg
+
+from settings import STROKE_CHECKPOINT_INTERVAL, STROKE_MAX_CHECKPOINTS
+
+
+def sidecar_path(state_path):
+    # state.json -> state.strokes.npz
+    return os.path.splitext(state_path)[0] + '.strokes.npz'
+
+
+class StrokeLayer:
+    # pencil layer of the map. finished strokes are (n, 2) int16 point arrays and every
+    # STROKE_CHECKPOINT_INTERVAL strokes a copy of the surface is kept, so undo only
+    # replays the strokes after the nearest checkpoint
+    def __init__(self, size, color=(200, 200, 200), width=2):
+        self.surface = pg.Surface(size, pg.SRCALPHA)
+        self.color = color
+        self.width = width
+        self.strokes = []
+        self.current = []
+        # stroke count -> surface with exactly that many strokes drawn
+        self.checkpoints = {}
+
+    def _draw(self, points):
+        if len(points) > 1:
+            pg.draw.lines(self.surface, self.color, False, points.tolist(), self.width)
+
+    def _commit(self, points):
+        self.strokes.append(points)
+        if len(self.strokes) % STROKE_CHECKPOINT_INTERVAL == 0:
+            self.checkpoints[len(self.strokes)] = self.surface.copy()
+            while len(self.checkpoints) > STROKE_MAX_CHECKPOINTS:
+                del self.checkpoints[min(self.checkpoints)]
+
+    def begin(self, pos):
+        self.current = [pos]
+
+    def extend(self, pos):
+        self.current.append(pos)
+        if len(self.current) > 1:
+            pg.draw.line(self.surface, self.color, self.current[-2], self.current[-1], self.width)
+
+    def end(self):
+        if self.current:
+            self._commit(np.array(self.current, dtype=np.int16))
+            self.current = []
+
+    def undo(self):
+        if not self.strokes:
+            return
+        self.strokes.pop()
+        count = len(self.strokes)
+        self.checkpoints.pop(count + 1, None)
+
+        # older checkpoints may have been dropped, then this falls back to a full replay
+        base = max((k for k in self.checkpoints if k <= count), default=0)
+        self.surface.fill((0, 0, 0, 0))
+        if base:
+            self.surface.blit(self.checkpoints[base], (0, 0))
+        for points in self.strokes[base:]:
+            self._draw(points)
+
+    # -- STORAGE --
+    # all points concatenated into one int16 array plus the stroke lengths
+
+    def save(self, path):
+        lengths = np.array([len(p) for p in self.strokes], dtype=np.int32)
+        points = np.concatenate(self.strokes) if self.strokes else np.zeros((0, 2), dtype=np.int16)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, points=points, lengths=lengths)
+        os.replace(tmp_path, path)
+
+    def load_strokes(self, strokes):
+        for points in strokes:
+            points = np.asarray(points, dtype=np.int16).reshape(-1, 2)
+            self._draw(points)
+            self._commit(points)
+
+    def load(self, path):
+        with np.load(path) as data:
+            points, lengths = data['points'], data['lengths']
+        self.load_strokes(np.split(points, np.cumsum(lengths)[:-1]) if len(lengths) else [])
@@ -0,0 +1,241 @@
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from settings import PAST_VALUE_SMOOTHING_WINDOW, SENSOR_INACTIVE_TIMEOUT, EPS, ESTIMATOR_MODE
+
+# tunes the settings.py constants behind the pipeline: replays a dataset through the real
+# registry ingest / smoothing / estimation code once per combination of smoothing window,
+# inactivity timeout, EPS and estimator, on a process pool. the dataset is turned into one
+# (ticks, motes) table up front and put in shared memory, workers map it instead of each
+# getting a pickled copy. configurations are scored by the error against the true position
+# when the source knows it (get_truth). the workbook and captures have no ground truth, there
+# the score is only a misfit: how badly the estimate explains a reference version of the
+# readings (a centred moving average over --reference-window ticks, the same for every
+# configuration, with the EPS of settings.py whatever EPS the configuration runs with)
+
+
+def load_table(path, seed, ticks, fps):
+    # (ticks, motes) readings with NaN where a mote has no sample, (motes, 2) centres and
+    # (ticks, 2) true positions or None
+    if path.endswith(".lscap"):
+        return capture_table(path, ticks, fps)
+    from synthetic import open_simulator
+    simulator = open_simulator(path, seed=seed)
+    ticks = simulator.tick_count if ticks is None else ticks
+    table = simulator.get_window(0, ticks)
+    truth = getattr(simulator, "get_truth", None)
+    return table, simulator.centres, truth(0, ticks) if truth else None
+
+
+def capture_table(path, ticks, fps):
+    # readings binned into frames of 1000 / fps ms, a mote's last reading in a frame wins.
+    # motes sit where the last layout block of the log put them, earlier moves are lost
+    from capture import CaptureLog
+    from sensor_registry import DEFAULT_CENTRE
+    log = CaptureLog(path)
+    readings = log.readings()
+    ids = np.unique(readings['id'])
+    frames = ((readings['t'] - log.start_time) * fps).astype(int)
+    count = frames[-1] + 1 if len(frames) else 0
+    ticks = count if ticks is None else min(ticks, count)
+    keep = frames < ticks
+
+    table = np.full((ticks, len(ids)), np.nan)
+    table[frames[keep], np.searchsorted(ids, readings['id'][keep])] = readings['light'][keep]
+
+    centres = np.tile(np.asarray(DEFAULT_CENTRE, dtype=float), (len(ids), 1))
+    layouts = log.layouts()
+    if layouts:
+        for sensor_id, x, y, _ in layouts[-1][1].tolist():
+            col = np.searchsorted(ids, sensor_id)
+            if col < len(ids) and ids[col] == sensor_id:
+                centres[col] = (x, y)
+    return table, centres, None
+
+
+def reference_readings(table, window):
+    # centred moving average of every mote over window ticks, NaN where a mote has no
+    # sample in it. looks ahead, so no smoothing setting can simply reproduce it
+    present = ~np.isnan(table)
+    sums = np.cumsum(np.vstack((np.zeros((1, table.shape[1])), np.where(present, table, 0.0))), axis=0)
+    counts = np.cumsum(np.vstack((np.zeros((1, table.shape[1])), present)), axis=0)
+    ticks = np.arange(len(table))
+    lo = np.clip(ticks - window // 2, 0, len(table))
+    hi = np.clip(ticks + window // 2 + 1, 0, len(table))
+    n = counts[hi] - counts[lo]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(n > 0, (sums[hi] - sums[lo]) / n, np.nan)
+
+
+def misfit(pt, positions, readings):
+    # estimator.fit_error with a fixed EPS, the workers swap the estimators' one
+    r = np.hypot(*(np.asarray(positions, dtype=float) - pt).T)
+    c = np.log(np.asarray(readings, dtype=float) + EPS) + 2.0 * np.log(r + EPS)
+    return float(np.sqrt(np.mean((c - c.mean()) ** 2)))
+
+
+# -- WORKERS --
+
+_shared = {}
+
+
+def _attach(blocks):
+    # pool initializer: map the shared arrays, blocks is name -> (shm name, shape)
+    for key, (name, shape) in blocks.items():
+        shm = shared_memory.SharedMemory(name=name)
+        # the block has to stay open as long as the view is used
+        _shared[key] = (shm, np.ndarray(shape, dtype=float, buffer=shm.buf))
+
+
+def _set_eps(eps):
+    # EPS is read at call time from the estimator modules' globals
+    import estimator
+    import grid_solver
+    estimator.EPS = grid_solver.EPS = eps
+    # the cached distance fields are log(d + EPS)
+    grid_solver.field_cache.invalidate()
+
+
+def run_config(config, centres, fps, use_tracker):
+    from replay_bench import make_solver
+    from sensor_registry import SensorRegistry
+
+    table = _shared["table"][1]
+    truth = _shared["truth"][1] if "truth" in _shared else None
+    reference = _shared["reference"][1] if "reference" in _shared else None
+    _set_eps(config["eps"])
+    registry = SensorRegistry(timeout_ms=config["timeout_ms"], window=config["window"])
+    solve = make_solver(config["mode"], use_tracker, fps)
+
+    latencies, errors = [], []
+    for tick, row in enumerate(table):
+        now = tick * 1000.0 / fps
+        present = np.flatnonzero(~np.isnan(row))
+        registry.ingest(present.tolist(), row[present], now, centres[present])
+        registry.expire(now)
+        if len(registry.active_slots()) < 2:
+            continue
+        positions, readings = registry.snapshot()
+
+        started = time.perf_counter()
+        position = solve(positions, readings, tick)
+        latencies.append(time.perf_counter() - started)
+
+        if truth is not None:
+            errors.append(float(np.hypot(*(np.asarray(position, dtype=float) - truth[tick]))))
+        else:
+            expected = np.flatnonzero(~np.isnan(reference[tick]))
+            if len(expected) >= 2:
+                errors.append(misfit(position, centres[expected], reference[tick, expected]))
+
+    latencies = np.array(latencies)
+    return {
+        **config,
+        "solves": len(latencies),
+        "solves_per_s": len(latencies) / latencies.sum() if len(latencies) else 0.0,
+        "p95_ms": float(np.percentile(latencies, 95) * 1e3) if len(latencies) else 0.0,
+        "score": float(np.mean(errors)) if errors else float("nan"),
+    }
+
+
+# -- PARENT --
+
+def share(array):
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=float, buffer=shm.buf)[:] = array
+    return shm
+
+
+def sweep(table, centres, truth, configs, fps, use_tracker, workers=None, reference=None):
+    blocks, shms = {}, []
+    try:
+        for key, array in (("table", table), ("truth", truth), ("reference", reference)):
+            if array is not None:
+                shm = share(np.asarray(array, dtype=float))
+                shms.append(shm)
+                blocks[key] = (shm.name, np.shape(array))
+
+        results = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach, initargs=(blocks,)) as pool:
+            futures = [pool.submit(run_config, config, centres, fps, use_tracker) for config in configs]
+            for future in as_completed(futures):
+                results.append(future.result())
+                print(f"\r{len(results)}/{len(configs)} configurations", end="", flush=True)
+        print()
+        return results
+    finally:
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+
+
+def rank(results):
+    # best score first (to 3 decimals, closer than that is noise), ties broken by
+    # throughput. a configuration is on the front when nothing ranked above it is faster.
+    # one that never got scored (NaN) goes last and is never on the front
+    def score(r):
+        return np.inf if np.isnan(r["score"]) else round(r["score"], 3)
+
+    results = sorted(results, key=lambda r: (score(r), -r["solves_per_s"]))
+    best_speed = -1.0
+    for r in results:
+        r["front"] = not np.isnan(r["score"]) and r["solves_per_s"] > best_speed
+        if r["front"]:
+            best_speed = r["solves_per_s"]
+    return results
+
+
+def print_table(results, metric):
+    print(f"{'#':>3}  {'window':>6}  {'timeout':>7}  {'eps':>7}  {'mode':<9}  {metric:>9}  "
+          f"{'solves/s':>8}  {'p95 ms':>7}")
+    for i, r in enumerate(results, 1):
+        print(f"{i:>3}  {r['window']:>6}  {r['timeout_ms']:>7}  {r['eps']:>7.0e}  {r['mode']:<9}  "
+              f"{r['score']:>9.3f}  {r['solves_per_s']:>8.0f}  {r['p95_ms']:>7.3f}" + ("  *" if r["front"] else ""))
+    print(f"* {metric} / throughput front")
+
+
+def values(kind):
+    return lambda text: [kind(v) for v in text.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="parameter sweep of the localisation pipeline over a dataset")
+    parser.add_argument("--data", default="simulated_data.xlsx", help="workbook, synthetic:<motes> or capture log (.lscap)")
+    parser.add_argument("--ticks", type=int, default=None, help="frames to replay (default: whole dataset)")
+    parser.add_argument("--fps", type=float, default=60.0, help="frame rate the replay pretends to run at")
+    parser.add_argument("--window", type=values(int), default=[15, 45, PAST_VALUE_SMOOTHING_WINDOW, 180],
+                        help="smoothing windows, comma separated")
+    parser.add_argument("--timeout", type=values(int), default=[300, SENSOR_INACTIVE_TIMEOUT, 3000],
+                        help="sensor inactivity timeouts in ms, comma separated")
+    parser.add_argument("--eps", type=values(float), default=[EPS, 1e-3, 1e-1], help="EPS values, comma separated")
+    parser.add_argument("--mode", type=values(str), default=["pairwise", "amplitude", "grid"],
+                        help="estimators, comma separated")
+    parser.add_argument("--reference-window", type=int, default=31,
+                        help="ticks averaged into the readings a misfit is scored against (no ground truth)")
+    parser.add_argument("--tracker", action="store_true", help="solve through the kalman tracker like the app")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per cpu)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    table, centres, truth = load_table(args.data, args.seed, args.ticks, args.fps)
+    configs = [{"window": w, "timeout_ms": t, "eps": e, "mode": m}
+               for w, t, e, m in itertools.product(args.window, args.timeout, args.eps, args.mode)]
+    print(f"{len(configs)} configurations over {len(table)} ticks of {args.data}, "
+          f"{args.workers or os.cpu_count()} workers (current settings: window {PAST_VALUE_SMOOTHING_WINDOW}, "
+          f"timeout {SENSOR_INACTIVE_TIMEOUT}, eps {EPS:.0e}, {ESTIMATOR_MODE})")
+
+    started = time.perf_counter()
+    reference = reference_readings(table, args.reference_window) if truth is None else None
+    results = rank(sweep(table, centres, truth, configs, args.fps, args.tracker, args.workers, reference))
+    print_table(results, "error px" if truth is not None else "misfit")
+    print(f"{time.perf_counter() - started:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
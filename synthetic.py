@@ -0,0 +1,193 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from settings import (WIDTH, HEIGHT, SENSOR_SIZE, SIMULATION_SAMPLE_RATE, SYNTHETIC_LAYOUT, SYNTHETIC_SOURCES,
+                      SYNTHETIC_TRAJECTORY, SYNTHETIC_SPEED, SYNTHETIC_BRIGHTNESS, SYNTHETIC_NOISE,
+                      SYNTHETIC_DROPOUT, SYNTHETIC_EXPONENT, SYNTHETIC_GAIN_SPREAD)
+
+# generated load for any number of motes: a layout of motes, light sources moving along a
+# trajectory, inverse-square readings with log-normal noise and random dropouts. same
+# get_window / iter_chunks interface as DataSimulator plus the true source positions
+# (get_truth), so it can stand in for the workbook anywhere ("synthetic:200" as the
+# simulator path), or drive a FakeMote pty in the sink's serial format (main below)
+
+LAYOUTS = ("grid", "ring", "random")
+TRAJECTORIES = ("static", "orbit", "wander")
+SYNTHETIC_PREFIX = "synthetic"
+# motes keep clear of the window edges
+MARGIN = 60
+# u16 light field of the sink frames
+MAX_LIGHT = 65535
+
+
+def layout_centres(kind, motes, rng):
+    if kind == "grid":
+        cols = int(np.ceil(np.sqrt(motes * WIDTH / HEIGHT)))
+        rows = int(np.ceil(motes / cols))
+        xs = np.linspace(MARGIN, WIDTH - MARGIN, cols)
+        ys = np.linspace(MARGIN, HEIGHT - MARGIN, rows) if rows > 1 else np.array([HEIGHT / 2])
+        return np.stack(np.meshgrid(xs, ys), axis=-1).reshape(-1, 2)[:motes]
+    if kind == "ring":
+        angles = np.linspace(0.0, 2.0 * np.pi, motes, endpoint=False)
+        radius = np.array([WIDTH, HEIGHT]) / 2 - MARGIN
+        return np.array([WIDTH / 2, HEIGHT / 2]) + np.column_stack((np.cos(angles), np.sin(angles))) * radius
+    if kind == "random":
+        return rng.uniform((MARGIN, MARGIN), (WIDTH - MARGIN, HEIGHT - MARGIN), (motes, 2))
+    raise ValueError(f"unknown layout {kind!r}, expected one of {LAYOUTS}")
+
+
+class SyntheticSource:
+    def __init__(self, motes=100, sources=SYNTHETIC_SOURCES, layout=SYNTHETIC_LAYOUT,
+                 trajectory=SYNTHETIC_TRAJECTORY, speed=SYNTHETIC_SPEED, brightness=SYNTHETIC_BRIGHTNESS,
+                 noise=SYNTHETIC_NOISE, dropout=SYNTHETIC_DROPOUT, rate=SIMULATION_SAMPLE_RATE,
+                 duration=None, exponent=SYNTHETIC_EXPONENT, gain_spread=SYNTHETIC_GAIN_SPREAD, seed=None):
+        if trajectory not in TRAJECTORIES:
+            raise ValueError(f"unknown trajectory {trajectory!r}, expected one of {TRAJECTORIES}")
+        self.rng = np.random.default_rng(seed)
+        self.sensor_ids = list(range(motes))
+        self.centres = layout_centres(layout, motes, self.rng)
+        self.max_count = motes
+        self.sources = sources
+        self.trajectory = trajectory
+        self.speed = speed
+        self.brightness = brightness
+        self.noise = noise
+        self.dropout = dropout
+        self.rate = rate
+        # a real room: light falls off with some other exponent, motes are not matched
+        self.exponent = exponent
+        self.gains = self.rng.normal(0.0, gain_spread, motes)
+        # iter_chunks() stops here, the generator itself never runs out (default a minute)
+        self.tick_count = int(60 * rate) if duration is None else int(duration * rate)
+
+        # per source: orbit radius / phase, or the frequencies and phases of its wander
+        self.phase = self.rng.uniform(0.0, 2.0 * np.pi, sources)
+        self.radius = np.linspace(0.35, 0.15, sources)[:, None] * np.array([WIDTH, HEIGHT])
+        self.home = self.rng.uniform((MARGIN, MARGIN), (WIDTH - MARGIN, HEIGHT - MARGIN), (sources, 2))
+        self.freq = self.rng.uniform(0.5, 1.5, (sources, 3, 2))
+        self.wander_phase = self.rng.uniform(0.0, 2.0 * np.pi, (sources, 3, 2))
+
+    def get_truth(self, start, stop, all_sources=False):
+        # (stop - start, 2) position of the strongest source, or (stop - start, sources, 2)
+        t = np.arange(start, stop)[:, None] / self.rate
+        centre = np.array([WIDTH / 2, HEIGHT / 2])
+        if self.trajectory == "static":
+            pos = np.broadcast_to(self.home, (len(t), self.sources, 2)).copy()
+        elif self.trajectory == "orbit":
+            # angular speed so the source covers `speed` px/s along its (elliptic) orbit
+            omega = self.speed / self.radius.mean(axis=1)
+            angle = self.phase + omega * t
+            pos = centre + np.stack((np.cos(angle), np.sin(angle)), axis=-1) * self.radius
+        else:
+            # smooth pseudo-random path: three sinusoids per axis, deterministic in t so every
+            # window agrees with the others however the ticks are chunked
+            spread = (np.array([WIDTH, HEIGHT]) / 2 - MARGIN) / 3
+            omega = self.freq * self.speed / spread.mean()
+            waves = np.sin(omega * t[:, :, None, None] + self.wander_phase)
+            pos = centre + waves.sum(axis=2) * spread
+        return pos if all_sources else pos[:, 0]
+
+    def get_window(self, start, stop):
+        # (stop - start, motes) readings, NaN where a mote dropped out
+        sources = self.get_truth(start, stop, all_sources=True)
+        d = np.linalg.norm(self.centres[None, None] - sources[:, :, None], axis=-1)
+        # the first source is the brightest, later ones half as bright each
+        strength = self.brightness * 0.5 ** np.arange(self.sources)
+        light = np.einsum('s,tsm->tm', strength, 1.0 / np.maximum(d, SENSOR_SIZE) ** self.exponent)
+        light *= np.exp(self.gains)
+
+        ticks = stop - start
+        light *= np.exp(self.rng.normal(0.0, self.noise, (ticks, self.max_count)))
+        light = np.clip(light, 0.0, MAX_LIGHT)
+        light[self.rng.random((ticks, self.max_count)) < self.dropout] = np.nan
+        return light
+
+    def iter_chunks(self, chunk_size=1024, start=0, stop=None):
+        stop = self.tick_count if stop is None else stop
+        for chunk_start in range(start, stop, chunk_size):
+            yield chunk_start, self.get_window(chunk_start, min(chunk_start + chunk_size, stop))
+
+    def get_light_values(self, index):
+        return tuple(None if np.isnan(v) else float(v) for v in self.get_window(index, index + 1)[0])
+
+    def layout_state(self):
+        # state.json sensors for this layout, e.g. for headless.py --layout
+        return {"sensors": [{"x": int(x) - SENSOR_SIZE // 2, "y": int(y) - SENSOR_SIZE // 2,
+                             "width": SENSOR_SIZE, "height": SENSOR_SIZE, "active": False, "sensor_id": i}
+                            for i, (x, y) in enumerate(self.centres.tolist())]}
+
+
+def open_simulator(spec, seed=None):
+    # "synthetic" or "synthetic:<motes>" for generated data, else a workbook path
+    if spec.split(":")[0] == SYNTHETIC_PREFIX:
+        motes = spec.partition(":")[2]
+        return SyntheticSource(int(motes) if motes else 100, seed=seed)
+    from data_simulator import DataSimulator
+    return DataSimulator(spec, seed=seed)
+
+
+def sink_frames(window, tick, binary):
+    # one tick of readings as the sink would print them, seq wraps like the firmware's u8
+    from fake_mote import format_frame, format_binary_frame
+    from serial_reader import MAX_RECORDS
+    present = np.flatnonzero(~np.isnan(window))
+    readings = [(int(i), int(round(window[i])), tick % 256) for i in present]
+    if binary:
+        return b"".join(format_binary_frame(readings[i:i + MAX_RECORDS])
+                        for i in range(0, len(readings), MAX_RECORDS))
+    return b"".join(format_frame(*reading) for reading in readings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="synthetic sink mote on a pty, any number of motes")
+    parser.add_argument("--motes", type=int, default=100)
+    parser.add_argument("--sources", type=int, default=SYNTHETIC_SOURCES)
+    parser.add_argument("--layout", default=SYNTHETIC_LAYOUT, choices=LAYOUTS)
+    parser.add_argument("--trajectory", default=SYNTHETIC_TRAJECTORY, choices=TRAJECTORIES)
+    parser.add_argument("--speed", type=float, default=SYNTHETIC_SPEED, help="source speed in px/s")
+    parser.add_argument("--noise", type=float, default=SYNTHETIC_NOISE, help="log-normal reading noise")
+    parser.add_argument("--dropout", type=float, default=SYNTHETIC_DROPOUT, help="chance a reading goes missing")
+    parser.add_argument("--exponent", type=float, default=SYNTHETIC_EXPONENT, help="path-loss exponent of the room")
+    parser.add_argument("--gain-spread", type=float, default=SYNTHETIC_GAIN_SPREAD, help="sd of the motes' log gains")
+    parser.add_argument("--rate", type=float, default=SIMULATION_SAMPLE_RATE, help="rounds of readings per second")
+    parser.add_argument("--binary", action="store_true", help="send batched binary frames like BINARY_OUTPUT firmware")
+    parser.add_argument("--layout-out", default="synthetic-layout.json",
+                        help="write the layout here as state.json sensors (for headless.py --layout)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    from fake_mote import FakeMote
+    source = SyntheticSource(args.motes, args.sources, args.layout, args.trajectory, args.speed,
+                             noise=args.noise, dropout=args.dropout, rate=args.rate, exponent=args.exponent,
+                             gain_spread=args.gain_spread, seed=args.seed)
+    with open(args.layout_out, "w") as f:
+        json.dump(source.layout_state(), f)
+    mote = FakeMote()
+    print(f"Synthetic sink with {args.motes} motes on {mote.port}, layout in {args.layout_out}")
+
+    tick, sent = 0, 0
+    started = time.monotonic()
+    try:
+        while True:
+            # a second's worth of rounds per window, each round goes out on its own schedule
+            window = source.get_window(tick, tick + int(max(args.rate, 1)))
+            for row in window:
+                mote.write(sink_frames(row, tick, args.binary))
+                sent += np.count_nonzero(~np.isnan(row))
+                tick += 1
+                delay = started + tick / args.rate - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mote.close()
+        elapsed = time.monotonic() - started
+        print(f"{sent} readings in {tick} rounds, {sent / max(elapsed, 1e-9):.0f} readings/s")
+
+
+if __name__ == "__main__":
+    main()
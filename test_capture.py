@@ -0,0 +1,43 @@
+import numpy as np
+
+from capture import CaptureWriter, LogReplay
+from display import Sensor, add_sensor_views
+from sensor_registry import SensorRegistry
+from serial_reader import Reading
+from settings import SENSOR_SIZE
+
+
+def test_replayed_layout_moves_and_toggles_views(tmp_path):
+    path = str(tmp_path / "layout.lscap")
+    writer = CaptureWriter(path)
+    ids = [1, 2]
+    writer.write_layout(100.0, ids, np.array([[100.0, 100.0], [300.0, 200.0]]), [True, True])
+    writer.write_readings([Reading(1, 500, 0, 100.5), Reading(2, 400, 0, 100.5)])
+    # mote 1 dragged, mote 2 switched off
+    writer.write_layout(101.0, ids, np.array([[250.0, 150.0], [300.0, 200.0]]), [True, False])
+    writer.close()
+
+    registry = SensorRegistry()
+    sensors = []
+    replay = LogReplay(path, speed=None)
+    while not replay.done:
+        replay.feed(registry, 0.0)
+        add_sensor_views(registry, sensors)
+
+    moved, toggled = (sensors[registry.slot_of(sensor_id)] for sensor_id in ids)
+    assert tuple(registry.positions[moved.slot]) == (250.0, 150.0)
+    assert moved.rect.center == (250, 150)
+    assert moved.rect.size == (SENSOR_SIZE, SENSOR_SIZE)
+    assert moved.slider.bar_rect.topleft == (250 - SENSOR_SIZE // 2 - 90, 150 - SENSOR_SIZE // 2 + 40)
+    assert moved.active
+    assert not registry.active[toggled.slot]
+    assert not toggled.active
+
+
+def test_sensor_views_follow_a_drag():
+    registry = SensorRegistry()
+    sensor = Sensor(100, 100, SENSOR_SIZE, SENSOR_SIZE, registry=registry)
+    sensor.x, sensor.y = 200, 250
+    assert sensor.rect.topleft == (200, 250)
+    assert sensor.slider.bar_rect.topleft == (200 - 90, 290)
+    assert sensor.toggle.rect.topleft == (240, 240)
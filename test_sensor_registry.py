@@ -0,0 +1,12 @@
+from sensor_registry import SensorRegistry
+
+
+def test_expired_mote_comes_back_without_its_old_history():
+    registry = SensorRegistry(timeout_ms=100, window=10)
+    for t in range(5):
+        registry.ingest([7], [1000.0], t * 10)
+    registry.expire(500)
+    assert not registry.active[0]
+
+    registry.ingest([7], [10.0], 510)
+    assert registry.values[0] == 10.0
@@ -0,0 +1,110 @@
+import time
+
+import numpy as np
+
+from estimator import estimate, estimate_sources, fit_error
+from settings import WIDTH, HEIGHT, MAX_SOURCES, TRACKER_ACCEL_NOISE, TRACKER_MEASUREMENT_NOISE, TRACKER_FIT_TOLERANCE
+
+
+class SourceTracker:
+    # state is (x, y, vx, vy); every solve is warm started from the predicted position
+    # estimate is the stateless solve underneath, e.g. an EstimateCache around it
+    def __init__(self, accel_noise=TRACKER_ACCEL_NOISE, measurement_noise=TRACKER_MEASUREMENT_NOISE,
+                 fit_tolerance=TRACKER_FIT_TOLERANCE, mode=None, estimate=estimate):
+        self.estimate = estimate
+        self.accel_noise = accel_noise
+        self.measurement_noise = measurement_noise
+        self.fit_tolerance = fit_tolerance
+        self.mode = mode
+        self.state = None
+        self.cov = None
+        self.last_time = None
+        # misfit of the last real solve, the bar a prediction has to meet to skip one
+        self.solved_error = None
+        self.solves = 0
+        self.skipped = 0
+        self.iterations = 0
+
+    def reset(self):
+        self.state = None
+        self.cov = None
+        self.last_time = None
+        self.solved_error = None
+
+    def predict(self, t):
+        dt = max(t - self.last_time, 0.0)
+        self.last_time = t
+        f = np.eye(4)
+        f[0, 2] = f[1, 3] = dt
+
+        # white-noise acceleration
+        q1 = np.array([[dt ** 4 / 4, dt ** 3 / 2],
+                       [dt ** 3 / 2, dt ** 2]]) * self.accel_noise ** 2
+        q = np.zeros((4, 4))
+        q[np.ix_([0, 2], [0, 2])] = q1
+        q[np.ix_([1, 3], [1, 3])] = q1
+
+        self.state = f @ self.state
+        self.cov = f @ self.cov @ f.T + q
+        return self.state[:2].copy()
+
+    def correct(self, measured):
+        h = np.zeros((2, 4))
+        h[0, 0] = h[1, 1] = 1.0
+        s = h @ self.cov @ h.T + np.eye(2) * self.measurement_noise ** 2
+        k = self.cov @ h.T @ np.linalg.inv(s)
+        self.state = self.state + k @ (np.asarray(measured, dtype=float) - h @ self.state)
+        self.cov = (np.eye(4) - k @ h) @ self.cov
+
+    def _solve(self, positions, readings, x0):
+        res = self.estimate(positions, readings, mode=self.mode, x0=x0)
+        self.solves += 1
+        self.iterations += res.nfev
+        self.solved_error = fit_error(res.x[:2], positions, readings)
+        return res.x[:2]
+
+    def step(self, positions, readings, t=None):
+        t = time.perf_counter() if t is None else t
+
+        if self.state is None:
+            measured = self._solve(positions, readings, None)
+            self.state = np.array([measured[0], measured[1], 0.0, 0.0])
+            self.cov = np.diag([self.measurement_noise ** 2] * 2 + [self.accel_noise ** 2] * 2)
+            self.last_time = t
+            return tuple(map(int, self.state[:2]))
+
+        predicted = self.predict(t)
+        if fit_error(predicted, positions, readings) <= self.solved_error + self.fit_tolerance:
+            self.skipped += 1
+        else:
+            self.correct(self._solve(positions, readings, predicted))
+        return tuple(map(int, self.state[:2]))
+
+
+class MultiSourceEstimator:
+    # every K's fit from the last frame is the warm start for the same K in the next one
+    def __init__(self, max_sources=MAX_SOURCES, estimate=estimate_sources):
+        self.estimate = estimate
+        self.max_sources = max_sources
+        self.starts = {}
+        self.k = 0
+        self.solves = 0
+        self.iterations = 0
+
+    def reset(self):
+        self.starts = {}
+
+    def step(self, positions, readings):
+        # list of source positions, strongest first
+        res = self.estimate(positions, readings, max_k=self.max_sources, starts=self.starts)
+        self.solves += 1
+        self.iterations += sum(fit.nfev for fit in res.fits.values())
+
+        # a fit that wandered off the map starts from scratch next frame
+        self.starts = {}
+        for k, fit in res.fits.items():
+            sources = fit.x.reshape(-1, 3)
+            if np.all(np.isfinite(sources)) and np.all(np.abs(sources[:, :2] - (WIDTH / 2, HEIGHT / 2)) < (WIDTH, HEIGHT)):
+                self.starts[k] = fit.x
+        self.k = res.k
+        return [tuple(map(int, source[:2])) for source in res.x.reshape(-1, 3)]